@@ -2,15 +2,15 @@ import os
 from typing import TypedDict, List
 from aws_cdk import (
     RemovalPolicy,
-    SecretValue,
     aws_ec2 as ec2,
-    aws_rds as rds
+    aws_rds as rds,
+    aws_secretsmanager as secretsmanager
 )
 from constructs import Construct
 
 
 class AuroraConfig(TypedDict):
-    pass
+    secret: secretsmanager.ISecret
 
 
 class Aurora(Construct):
@@ -36,14 +36,14 @@ class Aurora(Construct):
             )
         )
 
-        rds.ServerlessCluster(
+        aurora_cluster = rds.ServerlessCluster(
             self,
             'AuroraCluster',
             engine=rds.DatabaseClusterEngine.aurora_postgres(version=rds.AuroraPostgresEngineVersion.VER_13_6),
             cluster_identifier='itada-aurora-cluster',
-            credentials=rds.Credentials.from_password(
+            credentials=rds.Credentials.from_generated_secret(
                 username=os.getenv('AURORACLUSTER_USERNAME'),
-                password=SecretValue.unsafe_plain_text(os.getenv('AURORACLUSTER_USERPW'))
+                secret_name='itada-aurora-cluster-credentials'
             ),
             default_database_name='dev',
             security_groups= security_groups,
@@ -57,7 +57,9 @@ class Aurora(Construct):
         )
 
         # Configuration parameters
-        self._config: AuroraConfig = {}
+        self._config: AuroraConfig = {
+            'secret': aurora_cluster.secret
+        }
 
     @property
     def config(self) -> AuroraConfig:
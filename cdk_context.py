@@ -0,0 +1,8 @@
+import json
+from constructs import Construct
+
+
+def context_dict(scope: Construct, key: str) -> dict:
+    # Values passed with `cdk -c key=...` arrive as JSON strings
+    value = scope.node.try_get_context(key) or {}
+    return json.loads(value) if isinstance(value, str) else value
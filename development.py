@@ -7,6 +7,7 @@ from iam.infrastructure import Iam
 from ec2.infrastructure import Ec2
 from alb.infrastructure import Alb
 from s3.infrastructure import S3
+from sqs.infrastructure import Sqs
 from redshift.infrastructure import Redshift
 from aurora.infrastructure import Aurora
 from lambda_.infrastructure import Lambda
@@ -44,6 +45,13 @@ class Itada(Stack):
         # ====== S3 ======
         s3_config = S3(self, 'S3').config
 
+        # ====== SQS ======
+        sqs_config = Sqs(
+            self,
+            'Sqs',
+            glue_datasource=s3_config['glue_datasource']
+        ).config
+
         # ====== REDSHIFT ======
         redshift_config = Redshift(
             self, 'Redshift',
@@ -57,7 +65,7 @@ class Itada(Stack):
             'Aurora',
             vpc=ec2_config['itada_vpc'],
             security_groups=[ec2_config['auroracluster_sg']]
-        )
+        ).config
 
         # ====== LAMBDA ======
         lambda_config = Lambda(
@@ -66,8 +74,13 @@ class Itada(Stack):
             cdkscripts_bucket=s3_config['itada_cdk_scripts'],
             lambdafunc_role=iam_config['lambdafunc_role'],
             security_groups=[ec2_config['default_sg']],
-            vpc=ec2_config['itada_vpc']
-        )
+            vpc=ec2_config['itada_vpc'],
+            queues=sqs_config['queues'],
+            secrets={
+                'aurora': aurora_config['secret'],
+                'redshift': redshift_config['secret']
+            }
+        ).config
 
         # ====== GLUE ======
         glue_config = Glue(
@@ -79,12 +92,24 @@ class Itada(Stack):
             rs_attr_endpoint_address=redshift_config['attr_endpoint_address'],
             rs_attr_endpoint_port=redshift_config['attr_endpoint_port'],
             rs_db_name=redshift_config['db_name'],
-            gluejob_role_arn=iam_config['gluejob_role'].role_arn
-        )
+            rs_secret=redshift_config['secret'],
+            gluejob_role=iam_config['gluejob_role'],
+            spark_ui_logs_bucket=s3_config['metadata_center'],
+            pipeline_load_functions=[
+                lambda_config['aliases'][function_name]
+                for function_name in ['develop-postgres-raw-data-validation', 'develop-redshift', 'aurora-sync']
+            ]
+        ).config
 
         # ====== STEPFUNCTIONS ======
         stepfunctions_config = Stepfunctions(
             self,
             'Stepfunctions',
-            stepfunction_role_arn=iam_config['stepfunction_role'].role_arn
-        )
\ No newline at end of file
+            stepfunction_role_arn=iam_config['stepfunction_role'].role_arn,
+            glue_jobs=glue_config['jobs'],
+            glue_job_capacity=glue_config['job_capacity'],
+            glue_pipeline_branches=glue_config['pipeline_branches'],
+            lambda_functions=lambda_config['functions'],
+            lambda_aliases=lambda_config['aliases'],
+            glue_datasource=s3_config['glue_datasource']
+        ).config
\ No newline at end of file
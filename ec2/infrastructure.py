@@ -1,12 +1,13 @@
 from email.policy import default
 import os
-from typing import TypedDict
+from typing import Dict, TypedDict
 from aws_cdk import (
     RemovalPolicy,
     aws_iam as iam,
     aws_ec2 as ec2
 )
 from constructs import Construct
+from cdk_context import context_dict
 
 
 class Ec2Config(TypedDict):
@@ -21,6 +22,8 @@ class Ec2Config(TypedDict):
     auroracluster_sg: ec2.SecurityGroup
     redshiftcluster_sg: ec2.SecurityGroup
     glue_sg: ec2.SecurityGroup
+    vpcendpoint_sg: ec2.SecurityGroup
+    vpc_endpoints: Dict[str, ec2.VpcEndpoint]
     amundsen_instance: ec2.Instance
     chartservice_instance: ec2.Instance
 
@@ -45,7 +48,7 @@ class Ec2(Construct):
 
         # Extract subnet information
         pwn_subnets = itada_vpc.select_subnets(
-            subnet_type=ec2.SubnetType.PRIVATE_WITH_NAT
+            subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
         )
 
         public_subnets = itada_vpc.select_subnets(
@@ -178,6 +181,79 @@ class Ec2(Construct):
         glue_conn.allow_internally(
             port_range=ec2.Port.all_tcp()
         )
+        # Glue jobs reach Redshift through develop-redshift-connection
+        redshiftcluster_conn.allow_default_port_from(other=ec2.Peer.security_group_id(glue_sg.security_group_id))
+
+        # vpc-endpoint-sg
+        # Private DNS sends every AWS API call in the VPC (Lambdas, Glue jobs, instances)
+        # through the interface endpoints
+        vpcendpoint_sg = ec2.SecurityGroup(
+            self,
+            'VpcEndpointSg',
+            vpc=itada_vpc,
+            allow_all_outbound=True,
+            description='security group for VPC interface endpoints',
+            security_group_name='vpc-endpoint-sg'
+        )
+        vpcendpoint_sg.apply_removal_policy(RemovalPolicy.DESTROY)
+        vpcendpoint_conn = ec2.Connections(
+            default_port=ec2.Port.tcp(443),
+            security_groups=[vpcendpoint_sg]
+        )
+        vpcendpoint_conn.allow_default_port_from(other=ec2.Peer.ipv4(itada_vpc.vpc_cidr_block))
+
+        # VPC endpoints
+        # Keeps Lambda and Glue traffic to AWS services off the NAT gateway
+        vpc_endpoints: Dict[str, ec2.VpcEndpoint] = {}
+
+        vpc_endpoints['S3'] = itada_vpc.add_gateway_endpoint(
+            'S3GatewayEndpoint',
+            service=ec2.GatewayVpcEndpointAwsService.S3,
+            subnets=[
+                ec2.SubnetSelection(
+                    subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+                )
+            ]
+        )
+
+        interface_endpoint_configs = {
+            'Glue': {
+                'service': ec2.InterfaceVpcEndpointAwsService.GLUE
+            },
+            'SecretsManager': {
+                'service': ec2.InterfaceVpcEndpointAwsService.SECRETS_MANAGER
+            },
+            'StepFunctions': {
+                'service': ec2.InterfaceVpcEndpointAwsService.STEP_FUNCTIONS
+            },
+            'Sts': {
+                'service': ec2.InterfaceVpcEndpointAwsService.STS
+            },
+            'Logs': {
+                'service': ec2.InterfaceVpcEndpointAwsService.CLOUDWATCH_LOGS
+            },
+            'RedshiftData': {
+                'service': ec2.InterfaceVpcEndpointAwsService.REDSHIFT_DATA
+            }
+        }
+
+        # e.g. cdk deploy -c vpc_interface_endpoints='{"RedshiftData": false}'
+        endpoint_overrides = context_dict(self, 'vpc_interface_endpoints')
+
+        for endpoint_name, endpoint_props in interface_endpoint_configs.items():
+            if not endpoint_overrides.get(endpoint_name, True):
+                continue
+
+            vpc_endpoints[endpoint_name] = itada_vpc.add_interface_endpoint(
+                endpoint_name + 'InterfaceEndpoint',
+                service=endpoint_props['service'],
+                open=False,
+                private_dns_enabled=True,
+                security_groups=[vpcendpoint_sg],
+                subnets=ec2.SubnetSelection(
+                    subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+                )
+            )
 
         # Instances
         ebs_volumes = [
@@ -264,6 +340,8 @@ class Ec2(Construct):
             'auroracluster_sg': auroracluster_sg,
             'redshiftcluster_sg': redshiftcluster_sg,
             'glue_sg': glue_sg,
+            'vpcendpoint_sg': vpcendpoint_sg,
+            'vpc_endpoints': vpc_endpoints,
             'amundsen_instance': returned_instance_dict['Amundsen'],
             'chartservice_instance': returned_instance_dict['ChartService']
         }
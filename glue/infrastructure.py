@@ -1,15 +1,157 @@
+import json
 import os
-from typing import TypedDict, List
+from typing import Dict, List, Optional, Tuple, TypedDict
 from aws_cdk import (
+    Annotations,
+    FileSystem,
     RemovalPolicy,
+    Stack,
     aws_ec2 as ec2,
-    aws_glue as glue
+    aws_glue as glue,
+    aws_iam as iam,
+    aws_lambda as lambda_,
+    aws_s3 as s3,
+    aws_s3_assets as s3_assets,
+    aws_s3_deployment as s3deploy,
+    aws_secretsmanager as secretsmanager,
+    custom_resources as cr
 )
 from constructs import Construct
+from cdk_context import context_dict
+
+
+class CapacityProfile(TypedDict):
+    worker_type: str
+    number_of_workers: int
+    # NumberOfWorkers of auto-scaled jobs, the ceiling Glue scales up to
+    max_workers: int
+    timeout_mins: int
+    spark_conf: Dict[str, str]
+
+
+class JobTuning(TypedDict, total=False):
+    enable_metrics: bool
+    enable_continuous_cloudwatch_log: bool
+    enable_spark_ui: bool
+    enable_job_insights: bool
+    spark_conf: Dict[str, str]
+
+
+class JobCapacity(CapacityProfile):
+    tier: str
+    glue_version: str
+    auto_scaling: bool
+    execution_class: str
+    max_concurrent_runs: int
+
+
+class PythonLibs(TypedDict):
+    deployment: Optional[s3deploy.BucketDeployment]
+    url: str
+    wheel_urls: Dict[str, str]
 
 
 class GlueConfig(TypedDict):
-    pass
+    jobs: Dict[str, glue.CfnJob]
+    job_capacity: Dict[str, JobCapacity]
+    workflow_names: List[str]
+    pipeline_branches: Dict[str, List[str]]
+
+
+# Job dependencies are deployed from here to a content-hashed prefix under
+# s3://itada-datasource/python-libs/ once the zips below are built into it,
+# with pinned wheels for --additional-python-modules in wheelhouse/.
+PYTHON_LIBS_DIR = os.path.join(os.path.dirname(__file__), 'python_libs')
+PYTHON_LIBS_BUCKET = 'itada-datasource'
+PYTHON_LIBS_PREFIX = 'python-libs'
+EXTRA_PY_FILES = ['data_lineage.zip', 'etl_utils.zip']
+
+# Column schemas of declared tables without inline 'columns', one
+# <table_name>.json ({column: type}) per table (see README). A table without a
+# schema is skipped, Athena cannot read a table that declares no columns
+TABLE_SCHEMAS_DIR = os.path.join(os.path.dirname(__file__), 'table_schemas')
+
+# Join job of itada-pipeline-workflow, shipped with this stack
+PIPELINE_LOAD_SCRIPT = os.path.join(os.path.dirname(__file__), 'scripts', 'itada_pipeline_load.py')
+
+GLUE_VERSION = '3.0'
+# Jobs with 'auto_scaling' enabled or an 'iceberg' entry run on this version.
+# With auto-scaling Glue treats NumberOfWorkers as the ceiling and releases
+# idle workers below it, so those jobs are given the tier's max_workers
+LATEST_GLUE_VERSION = '4.0'
+
+# Iceberg tables, declared in db_configs or created by jobs with an 'iceberg'
+# entry, use merge-on-read so upserts only write delete files and new rows.
+# Snapshots past this retention are expired by itada_iceberg_maintenance.
+ICEBERG_TABLE_PROPERTIES = {
+    'format-version': '2',
+    'write.delete.mode': 'merge-on-read',
+    'write.update.mode': 'merge-on-read',
+    'write.merge.mode': 'merge-on-read',
+    'history.expire.max-snapshot-age-ms': str(7 * 24 * 60 * 60 * 1000),
+    'history.expire.min-snapshots-to-keep': '5'
+}
+
+# Profiling and Spark settings merged into every job. A job entry overrides
+# them with its 'tuning' key, and the 'glue_job_tuning' context value
+# ({'*' or job_name: JobTuning}) overrides both without code changes.
+DEFAULT_JOB_TUNING: JobTuning = {
+    'enable_metrics': True,
+    'enable_continuous_cloudwatch_log': True,
+    'enable_spark_ui': True,
+    'enable_job_insights': True,
+    'spark_conf': {
+        'spark.sql.adaptive.enabled': 'true',
+        'spark.sql.adaptive.coalescePartitions.enabled': 'true',
+        'spark.sql.adaptive.skewJoin.enabled': 'true'
+    }
+}
+
+# Capacity tiers picked by the 'capacity' key of each job entry.
+# Tiers can be reshaped per environment with the 'glue_capacity_profiles'
+# context value ({tier: {field: value}}), and single jobs can be moved to
+# another tier with 'glue_job_capacity' ({job_name: tier}).
+CAPACITY_PROFILES: Dict[str, CapacityProfile] = {
+    # 2 G.1X workers is the smallest glueetl job (G.025X is streaming only), so
+    # small saves through the 30 minute timeout and fewer shuffle partitions
+    # rather than through fewer DPUs
+    'small': {
+        'worker_type': 'G.1X',
+        'number_of_workers': 2,
+        'max_workers': 4,
+        'timeout_mins': 30,
+        'spark_conf': {
+            'spark.sql.shuffle.partitions': '8'
+        }
+    },
+    'standard': {
+        'worker_type': 'G.1X',
+        'number_of_workers': 2,
+        'max_workers': 10,
+        'timeout_mins': 180,
+        'spark_conf': {}
+    },
+    'memory_heavy': {
+        'worker_type': 'G.2X',
+        'number_of_workers': 4,
+        'max_workers': 16,
+        'timeout_mins': 480,
+        'spark_conf': {
+            'spark.memory.fraction': '0.8',
+            'spark.memory.storageFraction': '0.2'
+        }
+    },
+    'shuffle_heavy': {
+        'worker_type': 'G.2X',
+        'number_of_workers': 8,
+        'max_workers': 24,
+        'timeout_mins': 480,
+        'spark_conf': {
+            'spark.sql.shuffle.partitions': '320',
+            'spark.sql.adaptive.advisoryPartitionSizeInBytes': '128m'
+        }
+    }
+}
 
 
 class Glue(Construct):
@@ -24,7 +166,10 @@ class Glue(Construct):
         rs_attr_endpoint_address: str,
         rs_attr_endpoint_port: str,
         rs_db_name: str,
-        gluejob_role_arn: str
+        rs_secret: secretsmanager.ISecret,
+        gluejob_role: iam.Role,
+        spark_ui_logs_bucket: s3.IBucket,
+        pipeline_load_functions: List[lambda_.IFunction]
     ):
         super().__init__(scope, id)
 
@@ -40,6 +185,50 @@ class Glue(Construct):
                 'database_input': {
                     'description': 'Database that stores data in the Cloud',
                     'name': 'itada_aws'
+                },
+                'tables': {
+                    'WorkDbTransformationTable': {
+                        'name': 'work_db_transformation',
+                        'description': 'Daily work_db transformation output',
+                        'format': 'parquet',
+                        'location': 's3://itada-datasource/work_db/transformation/',
+                        'partition_keys': {
+                            'build_date': 'string'
+                        },
+                        'partition_projection': {
+                            'build_date': {
+                                'type': 'date',
+                                'format': 'yyyy-MM-dd',
+                                'range': '2022-01-01,NOW',
+                                'interval': '1',
+                                'interval.unit': 'DAYS'
+                            }
+                        },
+                        'partition_indexes': {
+                            'build_date_idx': ['build_date']
+                        }
+                    },
+                    'DposDbTransformationTable': {
+                        'name': 'dpos_db_transformation',
+                        'description': 'Daily dpos_db transformation output',
+                        'format': 'parquet',
+                        'location': 's3://itada-datasource/dpos_db/transformation/',
+                        'partition_keys': {
+                            'build_date': 'string'
+                        },
+                        'partition_projection': {
+                            'build_date': {
+                                'type': 'date',
+                                'format': 'yyyy-MM-dd',
+                                'range': '2022-01-01,NOW',
+                                'interval': '1',
+                                'interval.unit': 'DAYS'
+                            }
+                        },
+                        'partition_indexes': {
+                            'build_date_idx': ['build_date']
+                        }
+                    }
                 }
             },
             'MetadataCenterDatabase': {
@@ -56,15 +245,54 @@ class Glue(Construct):
             }
         }
 
+        # Tables are declared per database under 'tables' ({table_id: {'name', 'description',
+        # 'format', 'location', 'columns', 'partition_keys', 'partition_projection', 'partition_indexes'}}).
+        # 'partition_projection' ({partition_key: {'type': ..., ...}}) lets Athena compute partitions
+        # from the location template instead of listing them from the catalog, so the writing job
+        # must lay data out as <location>/<key>=<value>/, e.g. partitionKeys=['build_date'].
+        # 'format' is 'parquet' or 'iceberg'. Iceberg tables are created with their metadata
+        # at 'location' and track their own partitions, so they take no partition settings
         for db_id, db_props in db_configs.items():
-            glue.CfnDatabase(
+            database = glue.CfnDatabase(
                 self,
                 db_id,
                 catalog_id=catalog_id,
                 database_input=glue.CfnDatabase.DatabaseInputProperty(**db_props['database_input'])
-            ).apply_removal_policy(RemovalPolicy.DESTROY)
+            )
+            database.apply_removal_policy(RemovalPolicy.DESTROY)
+
+            for table_id, table_props in db_props.get('tables', {}).items():
+                columns = table_props.get('columns') or _table_schema(table_props['name'])
+                if not columns:
+                    Annotations.of(self).add_warning(
+                        f'Glue table {table_props["name"]} is skipped, '
+                        f'{TABLE_SCHEMAS_DIR}/{table_props["name"]}.json does not exist'
+                    )
+                    continue
+
+                self._create_table(
+                    table_id,
+                    {**table_props, 'columns': columns},
+                    catalog_id=catalog_id,
+                    database=database
+                )
 
         # Connection
+        # JDBC credentials are read by the job role at run time from these secrets
+        # ({'username': ..., 'password': ...}), created outside the stack (see README)
+        connection_secrets = {
+            'itada_dpos_db_connection': secretsmanager.Secret.from_secret_name_v2(
+                self,
+                'ItadaDposDbConnectionSecret',
+                'itada-dpos-db-connection-credentials'
+            ),
+            'develop-workdb-connection': secretsmanager.Secret.from_secret_name_v2(
+                self,
+                'DevelopWorkDbConnectionSecret',
+                'develop-workdb-connection-credentials'
+            )
+        }
+
         conn_configs = {
             'ItadaDposDbConnection': {
                 'connection_input': {
@@ -72,8 +300,7 @@ class Glue(Construct):
                     'connection_properties': {
                         'JDBC_CONNECTION_URL': os.getenv('ITADADPOSDB_CONNECTION_URL'),
                         'JDBC_ENFORCE_SSL': os.getenv('ITADADPOSDB_ENFORCE_SSL'),
-                        'USERNAME': os.getenv('ITADADPOSDB_USERNAME'),
-                        'PASSWORD': os.getenv('ITADADPOSDB_USERPW')
+                        'SECRET_ID': connection_secrets['itada_dpos_db_connection'].secret_name
                     }
                 }
             },
@@ -81,10 +308,9 @@ class Glue(Construct):
                 'connection_input': {
                     'name': 'develop-workdb-connection',
                     'connection_properties': {
-                        'JDBC_CONNECTION_URL': os.getenv('DEVELOPDWORKDB_CONNECTION_URL'),
-                        'JDBC_ENFORCE_SSL': os.getenv('DEVELOPDWORKDB_ENFORCE_SSL'),
-                        'USERNAME': os.getenv('DEVELOPDWORKDB_USERNAME'),
-                        'PASSWORD': os.getenv('DEVELOPDWORKDB_USERPW')
+                        'JDBC_CONNECTION_URL': os.getenv('DEVELOPWORKDB_CONNECTION_URL'),
+                        'JDBC_ENFORCE_SSL': os.getenv('DEVELOPWORKDB_ENFORCE_SSL'),
+                        'SECRET_ID': connection_secrets['develop-workdb-connection'].secret_name
                     }
                 }
             },
@@ -97,33 +323,81 @@ class Glue(Construct):
                             + rs_attr_endpoint_port + '/' + rs_db_name
                         ),
                         'JDBC_ENFORCE_SSL': os.getenv('DEVELOPREDSHIFT_ENFORCE_SSL'),
-                        'USERNAME': os.getenv('DEVELOPREDSHIFT_USERNAME'),
-                        'PASSWORD': os.getenv('DEVELOPREDSHIFT_USERPW')
+                        # Generated by the Redshift construct, read by the job role at run time
+                        'SECRET_ID': rs_secret.secret_name
                     }
                 }
             },
         }
 
-        # for conn_id, conn_props in conn_configs.items():
-        #     glue.CfnConnection(
-        #         self,
-        #         conn_id,
-        #         catalog_id=catalog_id,
-        #         connection_input=glue.CfnConnection.ConnectionInputProperty(
-        #             **conn_props['connection_input'],
-        #             connection_type='JDBC',
-        #             physical_connection_requirements=glue.CfnConnection.PhysicalConnectionRequirementsProperty(
-        #                 availability_zone=pwn_subnet.availability_zone,
-        #                 subnet_id=pwn_subnet.subnet_id,
-        #                 security_group_id_list=glue_sg_id_list #[ec2_config['glue_sg'].security_group_id],
-        #             ),
-        #         )
-        #     ).apply_removal_policy(RemovalPolicy.DESTROY)
+        for secret in [rs_secret, *connection_secrets.values()]:
+            secret.grant_read(gluejob_role)
+
+        connections: Dict[str, glue.CfnConnection] = {}
+        for conn_id, conn_props in conn_configs.items():
+            conn_name = conn_props['connection_input']['name']
+            # Unset properties come through as empty values and are left out
+            connection_properties = {
+                key: value
+                for key, value in conn_props['connection_input']['connection_properties'].items()
+                if value
+            }
+            if 'JDBC_CONNECTION_URL' not in connection_properties:
+                Annotations.of(self).add_warning(
+                    f'Glue connection {conn_name} is skipped, its JDBC connection URL is not set'
+                )
+                continue
+
+            connections[conn_name] = glue.CfnConnection(
+                self,
+                conn_id,
+                catalog_id=catalog_id,
+                connection_input=glue.CfnConnection.ConnectionInputProperty(
+                    name=conn_name,
+                    connection_properties=connection_properties,
+                    connection_type='JDBC',
+                    physical_connection_requirements=glue.CfnConnection.PhysicalConnectionRequirementsProperty(
+                        availability_zone=pwn_subnet.availability_zone,
+                        subnet_id=pwn_subnet.subnet_id,
+                        security_group_id_list=glue_sg_id_list
+                    )
+                )
+            )
+            connections[conn_name].apply_removal_policy(RemovalPolicy.DESTROY)
 
         # Job
+        # Jobs with a 'bookmark' entry only process rows (JDBC sources, ordered by the
+        # entry's 'keys') or files (S3 sources) that are new since their last run.
+        # Bookmarks only take effect for DynamicFrame reads with a transformation_ctx,
+        # JDBC reads also pass --BOOKMARK_KEYS/--BOOKMARK_KEYS_SORT_ORDER as
+        # 'jobBookmarkKeys'/'jobBookmarkKeysSortOrder', and the run must end with
+        # job.commit(). Every table a bookmarked staging job reads needs the key
+        # columns, monotonically increasing on insert and update.
+        # A backfill resets bookmarks through the 'glue_bookmark_resets' context value
+        # ({job_name: token}), the reset runs on deploy whenever a job's token changes.
+        #
+        # Staging jobs with a 'jdbc_read' entry get their JDBC fetch size and
+        # per-table partitioned read options ('hashfield', 'hashpartitions',
+        # 'fetchsize') as --JDBC_FETCH_SIZE and --JDBC_TABLE_OPTIONS (JSON), so large
+        # tables are read by several executors instead of a single cursor. The
+        # scripts pass a table's entry, or the '*' entry for tables without one, as
+        # additional_options of its read. '*' splits on the serial 'id' primary key,
+        # a table without one needs its own entry.
+        #
+        # 'max_concurrent_runs' (1 when unset) lets a job run for several partitions
+        # at once, e.g. from the backfill state machine. Bookmarked jobs keep 1, their
+        # bookmark state is shared by all runs. So do the transformation jobs until
+        # their scripts limit a run to its --BUILD_DATE, concurrent runs would each
+        # rewrite the full dataset.
+        jobs: Dict[str, glue.CfnJob] = {}
+        job_capacity: Dict[str, JobCapacity] = {}
+        spark_event_logs_path = spark_ui_logs_bucket.s3_url_for_object('spark-ui-logs')
+
+        python_libs = self._deploy_python_libs()
+
         # work_db shared arguments
         job_shared_args = {
-            '--extra-py-files': 's3://itada-datasource/python-libs/data_lineage.zip,s3://itada-datasource/python-libs/etl_utils.zip',
+            '--extra-py-files': ','.join(f'{python_libs["url"]}/{file_name}' for file_name in EXTRA_PY_FILES),
             '--class': 'GlueApp',
             '--BUCKET_NAME': 'itada-datasource',
             '--CLIENT_ID': 'ae59c4e9-0032-4122-a6ad-0f9484c71736'
@@ -138,12 +412,29 @@ class Glue(Construct):
                     '--CONNECTION_NAME': 'develop-workdb-connection',
                     '--DATASOURCE_NAME': 'postgres_onprem',
                     '--DATA_CATALOG_PREFIX': 'work_db_public_',
+                    # Still required by the script until its reads move to the job bookmark
                     '--LAST_BUILD_DATE_PATH': 'work_db/staging/last_build_date',
                     '--STAGING_PATH': 's3://itada-datasource/work_db/staging',
                     '--additional-python-modules': 'psycopg2-binary'
                 },
                 'description': 'Glue Job to extract work_db source data to staging',
-                'name': 'itada_work_db_staging'
+                'name': 'itada_work_db_staging',
+                'capacity': 'standard',
+                'auto_scaling': True,
+                'bookmark': {
+                    'keys': ['updated_at'],
+                    'sort_order': 'asc'
+                },
+                'jdbc_read': {
+                    'fetchsize': 10000,
+                    # {table_name or '*': {'hashfield': ..., 'hashpartitions': ..., 'fetchsize': ...}}
+                    'tables': {
+                        '*': {
+                            'hashfield': 'id',
+                            'hashpartitions': 8
+                        }
+                    }
+                }
             },
             'ItadaWorkDbRaw': {
                 'command': {
@@ -156,20 +447,39 @@ class Glue(Construct):
                     '--STAGING_PATH': 's3://itada-datasource/work_db/staging'
                 },
                 'description': 'Glue Job to upsert work_db raw data from staging',
-                'name': 'itada_work_db_raw'
+                'name': 'itada_work_db_raw',
+                'capacity': 'standard',
+                'auto_scaling': True,
+                'execution_class': 'FLEX',
+                'bookmark': {},
+                'iceberg': {
+                    'database': 'itada_aws',
+                    'warehouse': 's3://itada-datasource/work_db/raw'
+                }
             },
             'ItadaWorkDbClean': {
                 'command': {
                     'script_location': os.getenv('ITADAWORKDBCLEAN_JOB_SCRIPT')
                 },
                 'default_arguments': {
+                    '--DATA_CATALOG_PREFIX': 'work_db_public_',
                     '--ITADA_CLEAN_PATH': 's3://itada-datasource/work_db/clean/',
+                    # Still resolved by the script, raw tables are read as
+                    # glue_catalog.<--ICEBERG_DATABASE>.<--DATA_CATALOG_PREFIX><table>
                     '--ITADA_RAW_PATH': 's3://itada-datasource/work_db/raw/',
                     '--SELECTED_COLUMN': 'company_id',
                     '--STAGE': 'clean'
                 },
                 'description': 'Glue Job to clean work_db raw data',
-                'name': 'itada_work_db_clean'
+                'name': 'itada_work_db_clean',
+                'capacity': 'standard',
+                'auto_scaling': True,
+                'execution_class': 'FLEX',
+                # The raw stage is merge-on-read, only the Iceberg reader applies its delete files
+                'iceberg': {
+                    'database': 'itada_aws',
+                    'warehouse': 's3://itada-datasource/work_db/raw'
+                }
             },
             'ItadaWorkDbTransformation': {
                 'command': {
@@ -181,34 +491,25 @@ class Glue(Construct):
                     '--STAGE': 'transformation'
                 },
                 'description': 'Glue Job to transform work_db cleaned data',
-                'name': 'itada_work_db_transformation'
+                'name': 'itada_work_db_transformation',
+                'capacity': 'memory_heavy',
+                'auto_scaling': True
             }
         }
 
         for work_db_job_id, work_db_job_props in work_db_job_configs.items():
-            glue.CfnJob(
-                self,
+            jobs[work_db_job_props['name']], job_capacity[work_db_job_props['name']] = self._create_job(
                 work_db_job_id,
-                command=glue.CfnJob.JobCommandProperty(
-                    name='glueetl',
-                    python_version='3',
-                    script_location=work_db_job_props['command']['script_location']
-                ),
-                role=gluejob_role_arn,
+                work_db_job_props,
                 default_arguments={
                     **job_shared_args,
                     **work_db_job_props['default_arguments']
                 },
-                description=work_db_job_props['description'],
-                execution_property=glue.CfnJob.ExecutionPropertyProperty(
-                    max_concurrent_runs=1
-                ),
-                glue_version='3.0',
-                max_retries=0,
-                name=work_db_job_props['name'],
-                number_of_workers=2,
-                worker_type='G.1X'
-            ).apply_removal_policy(RemovalPolicy.DESTROY)
+                role=gluejob_role.role_arn,
+                connections=connections,
+                spark_event_logs_path=spark_event_logs_path,
+                python_libs=python_libs
+            )
 
         dpos_db_job_configs = {
             'ItadaDposDbStaging': {
@@ -219,12 +520,29 @@ class Glue(Construct):
                     '--CONNECTION_NAME': 'itada_dpos_db_connection',
                     '--DATASOURCE_NAME': 'postgres_onprem',
                     '--DATA_CATALOG_PREFIX': 'dpos_db_public_',
+                    # Still required by the script until its reads move to the job bookmark
                     '--LAST_BUILD_DATE_PATH': 'dpos_db/staging/last_build_date',
                     '--STAGING_PATH': 's3://itada-datasource/dpos_db/staging',
                     '--additional-python-modules': 'psycopg2-binary'
                 },
                 'description': 'Glue Job to extract dpos_db source data to staging',
-                'name': 'itada_dpos_db_staging'
+                'name': 'itada_dpos_db_staging',
+                'capacity': 'standard',
+                'auto_scaling': True,
+                'bookmark': {
+                    'keys': ['updated_at'],
+                    'sort_order': 'asc'
+                },
+                'jdbc_read': {
+                    'fetchsize': 10000,
+                    # {table_name or '*': {'hashfield': ..., 'hashpartitions': ..., 'fetchsize': ...}}
+                    'tables': {
+                        '*': {
+                            'hashfield': 'id',
+                            'hashpartitions': 8
+                        }
+                    }
+                }
             },
             'ItadaDposDbRaw': {
                 'command': {
@@ -237,19 +555,38 @@ class Glue(Construct):
                     '--STAGING_PATH': 's3://itada-datasource/dpos_db/staging'
                 },
                 'description': 'Glue Job to extract dpos_db raw data',
-                'name': 'itada_dpos_db_raw'
+                'name': 'itada_dpos_db_raw',
+                'capacity': 'standard',
+                'auto_scaling': True,
+                'execution_class': 'FLEX',
+                'bookmark': {},
+                'iceberg': {
+                    'database': 'itada_aws',
+                    'warehouse': 's3://itada-datasource/dpos_db/raw'
+                }
             },
             'ItadaDposDbClean': {
                 'command': {
                     'script_location': os.getenv('ITADADPOSDBCLEAN_JOB_SCRIPT')
                 },
                 'default_arguments': {
+                    '--DATA_CATALOG_PREFIX': 'dpos_db_public_',
                     '--ITADA_CLEAN_PATH': 's3://itada-datasource/dpos_db/clean/',
+                    # Still resolved by the script, raw tables are read as
+                    # glue_catalog.<--ICEBERG_DATABASE>.<--DATA_CATALOG_PREFIX><table>
                     '--ITADA_RAW_PATH': 's3://itada-datasource/dpos_db/raw/',
                     '--STAGE': 'clean'
                 },
                 'description': 'Glue Job to clean dpos_db raw data',
-                'name': 'itada_dpos_db_clean'
+                'name': 'itada_dpos_db_clean',
+                'capacity': 'standard',
+                'auto_scaling': True,
+                'execution_class': 'FLEX',
+                # The raw stage is merge-on-read, only the Iceberg reader applies its delete files
+                'iceberg': {
+                    'database': 'itada_aws',
+                    'warehouse': 's3://itada-datasource/dpos_db/raw'
+                }
             },
             'ItadaDposDbTransformation': {
                 'command': {
@@ -260,34 +597,25 @@ class Glue(Construct):
                     '--ITADA_TRANSFORMATION_PATH': 's3://itada-datasource/dpos_db/transformation/'
                 },
                 'description': 'Glue Job to transform dpos_db cleaned data',
-                'name': 'itada_dpos_db_transformation'
+                'name': 'itada_dpos_db_transformation',
+                'capacity': 'memory_heavy',
+                'auto_scaling': True
             }
         }
 
         for dpos_db_job_id, dpos_db_job_props in dpos_db_job_configs.items():
-            glue.CfnJob(
-                self,
+            jobs[dpos_db_job_props['name']], job_capacity[dpos_db_job_props['name']] = self._create_job(
                 dpos_db_job_id,
-                command=glue.CfnJob.JobCommandProperty(
-                    name='glueetl',
-                    python_version='3',
-                    script_location=dpos_db_job_props['command']['script_location']
-                ),
-                role=gluejob_role_arn,
+                dpos_db_job_props,
                 default_arguments={
                     **job_shared_args,
                     **dpos_db_job_props['default_arguments']
                 },
-                description=dpos_db_job_props['description'],
-                execution_property=glue.CfnJob.ExecutionPropertyProperty(
-                    max_concurrent_runs=1
-                ),
-                glue_version='3.0',
-                max_retries=0,
-                name=dpos_db_job_props['name'],
-                number_of_workers=2,
-                worker_type='G.1X'
-            ).apply_removal_policy(RemovalPolicy.DESTROY)
+                role=gluejob_role.role_arn,
+                connections=connections,
+                spark_event_logs_path=spark_event_logs_path,
+                python_libs=python_libs
+            )
         
         # Aside jobs
         aside_job_configs = {
@@ -303,34 +631,549 @@ class Glue(Construct):
                     '--class': 'GlueApp'
                 },
                 'description': 'Glue Job to convert upload csv file into parquet file',
-                'name': 'itada_upload_csv_to_parquet'
+                'name': 'itada_upload_csv_to_parquet',
+                'capacity': 'small'
+            },
+            # itada_parquet_compaction
+            'ItadaParquetCompaction': {
+                'command': {
+                    'script_location': os.getenv('ITADAPARQUETCOMPACTION_JOB_SCRIPT')
+                },
+                'default_arguments': {
+                    '--BUCKET_NAME': 'itada-datasource',
+                    # Iceberg tables such as the raw stage are compacted by itada_iceberg_maintenance
+                    '--COMPACTION_PREFIXES': 'upload/raw/parquet/',
+                    '--TARGET_FILE_SIZE_MB': '256',
+                    '--class': 'GlueApp'
+                },
+                'description': 'Glue Job to rewrite small parquet files into target size files',
+                'name': 'itada_parquet_compaction',
+                'capacity': 'standard',
+                'auto_scaling': True,
+                'execution_class': 'FLEX',
+                'schedule': 'cron(0 17 ? * SUN *)'
+            },
+            # itada_iceberg_maintenance
+            'ItadaIcebergMaintenance': {
+                'command': {
+                    'script_location': os.getenv('ITADAICEBERGMAINTENANCE_JOB_SCRIPT')
+                },
+                'default_arguments': {
+                    '--ICEBERG_DATABASES': 'itada_aws',
+                    '--TARGET_FILE_SIZE_MB': '256',
+                    '--class': 'GlueApp'
+                },
+                'description': 'Glue Job to expire snapshots and rewrite data files of Iceberg tables',
+                'name': 'itada_iceberg_maintenance',
+                'capacity': 'standard',
+                'auto_scaling': True,
+                'execution_class': 'FLEX',
+                'iceberg': {
+                    'warehouse': 's3://itada-datasource'
+                },
+                'schedule': 'cron(0 18 * * ? *)'
             }
         }
 
         for aside_job_id, aside_job_props in aside_job_configs.items():
-            glue.CfnJob(
-                self,
+            jobs[aside_job_props['name']], job_capacity[aside_job_props['name']] = self._create_job(
                 aside_job_id,
-                command=glue.CfnJob.JobCommandProperty(
-                    name='glueetl',
-                    python_version='3',
-                    script_location=aside_job_props['command']['script_location']
-                ),
-                role=gluejob_role_arn,
+                aside_job_props,
                 default_arguments=aside_job_props['default_arguments'],
-                description=aside_job_props['description'],
-                execution_property=glue.CfnJob.ExecutionPropertyProperty(
-                    max_concurrent_runs=1
-                ),
-                glue_version='3.0',
-                max_retries=0,
-                name=aside_job_props['name'],
-                number_of_workers=2,
-                worker_type='G.1X'
-            ).apply_removal_policy(RemovalPolicy.DESTROY)
+                role=gluejob_role.role_arn,
+                connections=connections,
+                spark_event_logs_path=spark_event_logs_path,
+                python_libs=python_libs
+            )
+
+            if 'schedule' in aside_job_props:
+                self._create_trigger(
+                    aside_job_id + 'ScheduleTrigger',
+                    jobs=jobs,
+                    action_job_names=[aside_job_props['name']],
+                    name=f'{aside_job_props["name"]}-schedule',
+                    schedule=aside_job_props['schedule']
+                )
+
+        # itada_pipeline_load, joins both pipelines in itada-pipeline-workflow.
+        # A Python shell job invoking 'pipeline_load_functions' in order: the raw
+        # data validation, the Redshift load and the Aurora sync
+        pipeline_load_script = s3_assets.Asset(self, 'ItadaPipelineLoadScript', path=PIPELINE_LOAD_SCRIPT)
+        pipeline_load_script.grant_read(gluejob_role)
+        for function in pipeline_load_functions:
+            function.grant_invoke(gluejob_role)
+
+        jobs['itada_pipeline_load'] = glue.CfnJob(
+            self,
+            'ItadaPipelineLoad',
+            command=glue.CfnJob.JobCommandProperty(
+                name='pythonshell',
+                python_version='3.9',
+                script_location=pipeline_load_script.s3_object_url
+            ),
+            role=gluejob_role.role_arn,
+            default_arguments={
+                '--FUNCTION_NAMES': ','.join(function.function_name for function in pipeline_load_functions)
+            },
+            description='Glue Job to validate and load both pipeline outputs into Redshift and Aurora',
+            execution_property=glue.CfnJob.ExecutionPropertyProperty(
+                max_concurrent_runs=1
+            ),
+            glue_version=GLUE_VERSION,
+            max_capacity=0.0625,
+            max_retries=0,
+            name='itada_pipeline_load',
+            timeout=30
+        )
+        jobs['itada_pipeline_load'].apply_removal_policy(RemovalPolicy.DESTROY)
+
+        # Workflow
+        # Each branch runs its jobs in the order they are listed, all branches
+        # start together and 'join_jobs' only start once every branch succeeded.
+        # develop-Itada-state-machine starts the same jobs, and they allow one run
+        # at a time, so only one of the two may run the pipeline at once: a second
+        # start fails with ConcurrentRunsExceededException (see README)
+        workflow_configs = {
+            'ItadaPipelineWorkflow': {
+                'name': 'itada-pipeline-workflow',
+                'description': 'Workflow running the work_db and dpos_db pipelines as parallel branches',
+                'schedule': None,
+                'branches': [
+                    [job_props['name'] for job_props in work_db_job_configs.values()],
+                    [job_props['name'] for job_props in dpos_db_job_configs.values()]
+                ],
+                'join_jobs': ['itada_pipeline_load']
+            }
+        }
+
+        for workflow_id, workflow_props in workflow_configs.items():
+            workflow = glue.CfnWorkflow(
+                self,
+                workflow_id,
+                description=workflow_props['description'],
+                name=workflow_props['name']
+            )
+            workflow.apply_removal_policy(RemovalPolicy.DESTROY)
+
+            self._create_trigger(
+                workflow_id + 'StartTrigger',
+                workflow=workflow,
+                jobs=jobs,
+                action_job_names=[branch[0] for branch in workflow_props['branches']],
+                name=f'{workflow_props["name"]}-start',
+                schedule=workflow_props['schedule']
+            )
+
+            for branch in workflow_props['branches']:
+                for upstream_job_name, job_name in zip(branch, branch[1:]):
+                    self._create_trigger(
+                        workflow_id + jobs[job_name].node.id + 'Trigger',
+                        workflow=workflow,
+                        jobs=jobs,
+                        action_job_names=[job_name],
+                        name=f'{workflow_props["name"]}-{job_name}',
+                        upstream_job_names=[upstream_job_name]
+                    )
+
+            if workflow_props['join_jobs']:
+                self._create_trigger(
+                    workflow_id + 'JoinTrigger',
+                    workflow=workflow,
+                    jobs=jobs,
+                    action_job_names=workflow_props['join_jobs'],
+                    name=f'{workflow_props["name"]}-join',
+                    upstream_job_names=[branch[-1] for branch in workflow_props['branches']]
+                )
 
         # Configuration parameters
-        self._config: GlueConfig = {}
+        self._config: GlueConfig = {
+            'jobs': jobs,
+            'job_capacity': job_capacity,
+            'workflow_names': [workflow_props['name'] for workflow_props in workflow_configs.values()],
+            # Job names of each source pipeline, in run order
+            'pipeline_branches': {
+                'work_db': [job_props['name'] for job_props in work_db_job_configs.values()],
+                'dpos_db': [job_props['name'] for job_props in dpos_db_job_configs.values()]
+            }
+        }
+
+    def _resolve_capacity(self, job_name: str, tier: str) -> JobCapacity:
+        tier = context_dict(self, 'glue_job_capacity').get(job_name, tier)
+        if tier not in CAPACITY_PROFILES:
+            raise ValueError(f'Unknown Glue capacity tier {tier!r} for job {job_name!r}')
+
+        profile_overrides = context_dict(self, 'glue_capacity_profiles').get(tier, {})
+        capacity: JobCapacity = {
+            'tier': tier,
+            **CAPACITY_PROFILES[tier],
+            **profile_overrides
+        }
+        if capacity['max_workers'] < capacity['number_of_workers']:
+            raise ValueError(
+                f'Glue capacity tier {tier!r} has max_workers {capacity["max_workers"]} '
+                f'below its number_of_workers {capacity["number_of_workers"]}'
+            )
+        return capacity
+
+    def _deploy_python_libs(self) -> PythonLibs:
+        unversioned_url = f's3://{PYTHON_LIBS_BUCKET}/{PYTHON_LIBS_PREFIX}'
+        if not all(os.path.isfile(os.path.join(PYTHON_LIBS_DIR, file_name)) for file_name in EXTRA_PY_FILES):
+            Annotations.of(self).add_warning(
+                f'Glue python libraries are not built in {PYTHON_LIBS_DIR}, jobs use the unversioned '
+                f'{unversioned_url}/ files and install modules from PyPI'
+            )
+            return {
+                'deployment': None,
+                'url': unversioned_url,
+                'wheel_urls': {}
+            }
+
+        version_prefix = f'{PYTHON_LIBS_PREFIX}/{FileSystem.fingerprint(PYTHON_LIBS_DIR)}'
+        python_libs_deployment = s3deploy.BucketDeployment(
+            self,
+            'PythonLibsDeployment',
+            destination_bucket=s3.Bucket.from_bucket_name(self, 'PythonLibsBucket', PYTHON_LIBS_BUCKET),
+            destination_key_prefix=version_prefix,
+            include=[*EXTRA_PY_FILES, 'wheelhouse/*.whl'],
+            exclude=['*'],
+            # Older versions stay in place for job runs that still reference them
+            prune=False,
+            retain_on_delete=True,
+            sources=[s3deploy.Source.asset(PYTHON_LIBS_DIR)]
+        )
+
+        wheelhouse_dir = os.path.join(PYTHON_LIBS_DIR, 'wheelhouse')
+        wheel_urls = {
+            _normalize_module_name(file_name.split('-')[0]): (
+                f's3://{PYTHON_LIBS_BUCKET}/{version_prefix}/wheelhouse/{file_name}'
+            )
+            for file_name in sorted(os.listdir(wheelhouse_dir) if os.path.isdir(wheelhouse_dir) else [])
+            if file_name.endswith('.whl')
+        }
+        return {
+            'deployment': python_libs_deployment,
+            'url': f's3://{PYTHON_LIBS_BUCKET}/{version_prefix}',
+            'wheel_urls': wheel_urls
+        }
+
+    def _create_table(
+        self,
+        table_id: str,
+        table_props: dict,
+        *,
+        catalog_id: str,
+        database: glue.CfnDatabase
+    ) -> glue.CfnTable:
+        open_table_format_input = None
+        if table_props['format'] == 'iceberg':
+            if any(key in table_props for key in ('partition_keys', 'partition_projection', 'partition_indexes')):
+                raise ValueError(f'Iceberg table {table_props["name"]!r} cannot declare Hive partitions')
+            parameters = ICEBERG_TABLE_PROPERTIES
+            storage_descriptor_props = {}
+            open_table_format_input = glue.CfnTable.OpenTableFormatInputProperty(
+                iceberg_input=glue.CfnTable.IcebergInputProperty(
+                    metadata_operation='CREATE',
+                    version=ICEBERG_TABLE_PROPERTIES['format-version']
+                )
+            )
+        elif table_props['format'] == 'parquet':
+            parameters = {
+                'classification': 'parquet',
+                'EXTERNAL': 'TRUE',
+                **_partition_projection_parameters(table_props)
+            }
+            storage_descriptor_props = {
+                'input_format': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+                'output_format': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+                'serde_info': glue.CfnTable.SerdeInfoProperty(
+                    serialization_library='org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'
+                )
+            }
+        else:
+            raise ValueError(f'Unsupported format {table_props["format"]!r} for table {table_props["name"]!r}')
+
+        table = glue.CfnTable(
+            self,
+            table_id,
+            catalog_id=catalog_id,
+            database_name=database.database_input.name,
+            open_table_format_input=open_table_format_input,
+            table_input=glue.CfnTable.TableInputProperty(
+                description=table_props.get('description'),
+                name=table_props['name'],
+                parameters=parameters,
+                partition_keys=_table_columns(table_props.get('partition_keys', {})) or None,
+                storage_descriptor=glue.CfnTable.StorageDescriptorProperty(
+                    columns=_table_columns(table_props['columns']),
+                    location=table_props['location'],
+                    **storage_descriptor_props
+                ),
+                table_type='EXTERNAL_TABLE'
+            )
+        )
+        table.apply_removal_policy(RemovalPolicy.DESTROY)
+        table.node.add_dependency(database)
+
+        # Partition indexes let GetPartitions filter server side instead of paging every partition.
+        # CloudFormation has no partition index resource, they are managed through the Glue API
+        table_key = {
+            'CatalogId': catalog_id,
+            'DatabaseName': database.database_input.name,
+            'TableName': table_props['name']
+        }
+        for index_name, index_keys in table_props.get('partition_indexes', {}).items():
+            partition_index = cr.AwsCustomResource(
+                self,
+                f'{table_id}{index_name.title().replace("_", "")}PartitionIndex',
+                on_create=cr.AwsSdkCall(
+                    service='Glue',
+                    action='createPartitionIndex',
+                    parameters={
+                        **table_key,
+                        'PartitionIndex': {
+                            'IndexName': index_name,
+                            'Keys': index_keys
+                        }
+                    },
+                    physical_resource_id=cr.PhysicalResourceId.of(
+                        f'{database.database_input.name}.{table_props["name"]}.{index_name}'
+                    )
+                ),
+                on_delete=cr.AwsSdkCall(
+                    service='Glue',
+                    action='deletePartitionIndex',
+                    parameters={**table_key, 'IndexName': index_name},
+                    ignore_error_codes_matching='EntityNotFoundException'
+                ),
+                policy=cr.AwsCustomResourcePolicy.from_sdk_calls(
+                    resources=[
+                        Stack.of(self).format_arn(service='glue', resource='catalog'),
+                        Stack.of(self).format_arn(
+                            service='glue',
+                            resource='database',
+                            resource_name=database.database_input.name
+                        ),
+                        Stack.of(self).format_arn(
+                            service='glue',
+                            resource='table',
+                            resource_name=f'{database.database_input.name}/{table_props["name"]}'
+                        )
+                    ]
+                )
+            )
+            partition_index.node.add_dependency(table)
+
+        return table
+
+    def _resolve_tuning(
+        self,
+        job_name: str,
+        job_tuning: JobTuning,
+        base_spark_conf: Dict[str, str]
+    ) -> JobTuning:
+        context_tuning = context_dict(self, 'glue_job_tuning')
+        layers: List[JobTuning] = [
+            DEFAULT_JOB_TUNING,
+            {'spark_conf': base_spark_conf},
+            job_tuning,
+            context_tuning.get('*', {}),
+            context_tuning.get(job_name, {})
+        ]
+
+        tuning: JobTuning = {'spark_conf': {}}
+        for layer in layers:
+            tuning.update({key: value for key, value in layer.items() if key != 'spark_conf'})
+            tuning['spark_conf'].update(layer.get('spark_conf', {}))
+        return tuning
+
+    def _create_job(
+        self,
+        job_id: str,
+        job_props: dict,
+        *,
+        default_arguments: Dict[str, str],
+        role: str,
+        connections: Dict[str, glue.CfnConnection],
+        spark_event_logs_path: str,
+        python_libs: PythonLibs
+    ) -> Tuple[glue.CfnJob, JobCapacity]:
+        capacity = self._resolve_capacity(job_props['name'], job_props['capacity'])
+        capacity['auto_scaling'] = job_props.get('auto_scaling', False)
+        capacity['execution_class'] = job_props.get('execution_class', 'STANDARD')
+        capacity['max_concurrent_runs'] = job_props.get('max_concurrent_runs', 1)
+        if 'bookmark' in job_props and capacity['max_concurrent_runs'] > 1:
+            raise ValueError(f'{job_props["name"]} has a job bookmark and cannot run concurrently')
+        capacity['glue_version'] = (
+            LATEST_GLUE_VERSION if capacity['auto_scaling'] or 'iceberg' in job_props else GLUE_VERSION
+        )
+
+        base_spark_conf = dict(capacity['spark_conf'])
+        if 'iceberg' in job_props:
+            base_spark_conf.update(_iceberg_spark_conf(job_props['iceberg']['warehouse']))
+        tuning = self._resolve_tuning(job_props['name'], job_props.get('tuning', {}), base_spark_conf)
+
+        default_arguments = dict(default_arguments)
+        if tuning['enable_metrics']:
+            default_arguments['--enable-metrics'] = 'true'
+        if tuning['enable_continuous_cloudwatch_log']:
+            default_arguments['--enable-continuous-cloudwatch-log'] = 'true'
+        if tuning['enable_spark_ui']:
+            default_arguments['--enable-spark-ui'] = 'true'
+            default_arguments['--spark-event-logs-path'] = f'{spark_event_logs_path}/{job_props["name"]}/'
+        if tuning['enable_job_insights']:
+            default_arguments['--enable-job-insights'] = 'true'
+        if tuning['spark_conf']:
+            default_arguments['--conf'] = _spark_conf_argument(tuning['spark_conf'])
+        if python_libs['deployment'] and '--additional-python-modules' in default_arguments:
+            # Install from the deployed wheelhouse instead of resolving through PyPI
+            default_arguments['--additional-python-modules'] = ','.join(
+                _wheel_url(job_props['name'], module, python_libs['wheel_urls'])
+                for module in default_arguments['--additional-python-modules'].split(',')
+            )
+            default_arguments['--python-modules-installer-option'] = '--no-index'
+        if capacity['auto_scaling']:
+            default_arguments['--enable-auto-scaling'] = 'true'
+        if 'iceberg' in job_props:
+            default_arguments['--datalake-formats'] = 'iceberg'
+            default_arguments['--ICEBERG_TABLE_PROPERTIES'] = json.dumps(ICEBERG_TABLE_PROPERTIES)
+            if 'database' in job_props['iceberg']:
+                default_arguments['--ICEBERG_DATABASE'] = job_props['iceberg']['database']
+        if 'jdbc_read' in job_props:
+            default_arguments.update(_jdbc_read_arguments(job_props['name'], job_props['jdbc_read']))
+        if 'bookmark' in job_props:
+            default_arguments['--job-bookmark-option'] = 'job-bookmark-enable'
+            if job_props['bookmark'].get('keys'):
+                default_arguments['--BOOKMARK_KEYS'] = ','.join(job_props['bookmark']['keys'])
+                default_arguments['--BOOKMARK_KEYS_SORT_ORDER'] = job_props['bookmark'].get('sort_order', 'asc')
+
+        connection_name = default_arguments.get('--CONNECTION_NAME')
+        job = glue.CfnJob(
+            self,
+            job_id,
+            command=glue.CfnJob.JobCommandProperty(
+                name='glueetl',
+                python_version='3',
+                script_location=job_props['command']['script_location']
+            ),
+            role=role,
+            connections=(
+                glue.CfnJob.ConnectionsListProperty(connections=[connection_name])
+                if connection_name in connections else None
+            ),
+            default_arguments=default_arguments,
+            description=job_props['description'],
+            execution_class=(
+                capacity['execution_class'] if capacity['execution_class'] != 'STANDARD' else None
+            ),
+            execution_property=glue.CfnJob.ExecutionPropertyProperty(
+                max_concurrent_runs=capacity['max_concurrent_runs']
+            ),
+            glue_version=capacity['glue_version'],
+            max_retries=0,
+            name=job_props['name'],
+            number_of_workers=(
+                capacity['max_workers'] if capacity['auto_scaling'] else capacity['number_of_workers']
+            ),
+            timeout=capacity['timeout_mins'],
+            worker_type=capacity['worker_type']
+        )
+        job.apply_removal_policy(RemovalPolicy.DESTROY)
+        if connection_name in connections:
+            job.node.add_dependency(connections[connection_name])
+        if python_libs['deployment']:
+            job.node.add_dependency(python_libs['deployment'])
+
+        bookmark_reset_token = context_dict(self, 'glue_bookmark_resets').get(job_props['name'])
+        if 'bookmark' in job_props and bookmark_reset_token:
+            reset_job_bookmark = cr.AwsSdkCall(
+                service='Glue',
+                action='resetJobBookmark',
+                parameters={
+                    'JobName': job_props['name']
+                },
+                # A job that never ran has no bookmark to reset
+                ignore_error_codes_matching='EntityNotFoundException',
+                physical_resource_id=cr.PhysicalResourceId.of(
+                    f'{job_props["name"]}-bookmark-reset-{bookmark_reset_token}'
+                )
+            )
+            bookmark_reset = cr.AwsCustomResource(
+                self,
+                job_id + 'BookmarkReset',
+                on_create=reset_job_bookmark,
+                on_update=reset_job_bookmark,
+                policy=cr.AwsCustomResourcePolicy.from_sdk_calls(
+                    resources=[
+                        Stack.of(self).format_arn(
+                            service='glue',
+                            resource='job',
+                            resource_name=job_props['name']
+                        )
+                    ]
+                )
+            )
+            bookmark_reset.node.add_dependency(job)
+
+        return job, capacity
+
+    def _create_trigger(
+        self,
+        trigger_id: str,
+        *,
+        jobs: Dict[str, glue.CfnJob],
+        action_job_names: List[str],
+        name: str,
+        workflow: Optional[glue.CfnWorkflow] = None,
+        upstream_job_names: Optional[List[str]] = None,
+        schedule: Optional[str] = None
+    ) -> glue.CfnTrigger:
+        if upstream_job_names:
+            trigger_props = {
+                'type': 'CONDITIONAL',
+                'predicate': glue.CfnTrigger.PredicateProperty(
+                    conditions=[
+                        glue.CfnTrigger.ConditionProperty(
+                            job_name=job_name,
+                            logical_operator='EQUALS',
+                            state='SUCCEEDED'
+                        )
+                        for job_name in upstream_job_names
+                    ],
+                    logical='AND'
+                ),
+                'start_on_creation': True
+            }
+        elif schedule:
+            trigger_props = {
+                'type': 'SCHEDULED',
+                'schedule': schedule,
+                'start_on_creation': True
+            }
+        else:
+            trigger_props = {
+                'type': 'ON_DEMAND'
+            }
+
+        trigger = glue.CfnTrigger(
+            self,
+            trigger_id,
+            actions=[
+                glue.CfnTrigger.ActionProperty(job_name=job_name)
+                for job_name in action_job_names
+            ],
+            name=name,
+            workflow_name=workflow.name if workflow else None,
+            **trigger_props
+        )
+        trigger.apply_removal_policy(RemovalPolicy.DESTROY)
+
+        # Jobs and workflow are referenced by name, so CloudFormation needs explicit ordering
+        if workflow:
+            trigger.node.add_dependency(workflow)
+        for job_name in action_job_names + (upstream_job_names or []):
+            trigger.node.add_dependency(jobs[job_name])
+
+        return trigger
 
     @property
     def config(self) -> GlueConfig:
@@ -339,3 +1182,81 @@ class Glue(Construct):
     @config.setter
     def config(self, value):
         self._config = value
+
+
+def _spark_conf_argument(spark_conf: Dict[str, str]) -> str:
+    # Glue only accepts a single --conf key, further settings are chained into its value
+    return ' --conf '.join(f'{key}={value}' for key, value in spark_conf.items())
+
+
+def _jdbc_read_arguments(job_name: str, jdbc_read: dict) -> Dict[str, str]:
+    for table_name, table_options in jdbc_read['tables'].items():
+        if 'hashpartitions' in table_options and 'hashfield' not in table_options:
+            raise ValueError(f'{job_name}: hashpartitions for table {table_name!r} requires a hashfield')
+
+    return {
+        '--JDBC_FETCH_SIZE': str(jdbc_read['fetchsize']),
+        '--JDBC_TABLE_OPTIONS': json.dumps({
+            table_name: {key: str(value) for key, value in table_options.items()}
+            for table_name, table_options in jdbc_read['tables'].items()
+        })
+    }
+
+
+def _normalize_module_name(name: str) -> str:
+    # Wheel file names replace '-' with '_' in the distribution name
+    return name.strip().lower().replace('-', '_')
+
+
+def _wheel_url(job_name: str, module: str, wheel_urls: Dict[str, str]) -> str:
+    module_name = _normalize_module_name(module.split('==')[0])
+    if module_name not in wheel_urls:
+        raise ValueError(f'{job_name}: no wheel for {module!r} in {PYTHON_LIBS_DIR}/wheelhouse')
+    return wheel_urls[module_name]
+
+
+def _iceberg_spark_conf(warehouse: str) -> Dict[str, str]:
+    return {
+        'spark.sql.extensions': 'org.apache.iceberg.spark.extensions.IcebergSparkSessionExtensions',
+        'spark.sql.catalog.glue_catalog': 'org.apache.iceberg.spark.SparkCatalog',
+        'spark.sql.catalog.glue_catalog.warehouse': warehouse,
+        'spark.sql.catalog.glue_catalog.catalog-impl': 'org.apache.iceberg.aws.glue.GlueCatalog',
+        'spark.sql.catalog.glue_catalog.io-impl': 'org.apache.iceberg.aws.s3.S3FileIO'
+    }
+
+
+def _table_columns(columns: Dict[str, str]) -> List[glue.CfnTable.ColumnProperty]:
+    return [
+        glue.CfnTable.ColumnProperty(name=column_name, type=column_type)
+        for column_name, column_type in columns.items()
+    ]
+
+
+def _table_schema(table_name: str) -> Dict[str, str]:
+    schema_path = os.path.join(TABLE_SCHEMAS_DIR, f'{table_name}.json')
+    if not os.path.isfile(schema_path):
+        return {}
+    with open(schema_path) as schema_file:
+        return json.load(schema_file)
+
+
+def _partition_projection_parameters(table_props: dict) -> Dict[str, str]:
+    if not table_props.get('partition_projection'):
+        return {}
+
+    location = table_props['location'].rstrip('/')
+    location_template = '/'.join(
+        f'{partition_key}=${{{partition_key}}}' for partition_key in table_props['partition_keys']
+    )
+    parameters = {
+        'projection.enabled': 'true',
+        'storage.location.template': f'{location}/{location_template}/'
+    }
+    for partition_key, projection in table_props['partition_projection'].items():
+        if partition_key not in table_props['partition_keys']:
+            raise ValueError(f'Projected column {partition_key!r} is not a partition key of {table_props["name"]!r}')
+        parameters.update({
+            f'projection.{partition_key}.{setting}': value
+            for setting, value in projection.items()
+        })
+    return parameters
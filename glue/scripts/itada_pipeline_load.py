@@ -0,0 +1,36 @@
+"""Join job of itada-pipeline-workflow.
+
+Invokes the functions of --FUNCTION_NAMES one after the other, the way
+develop-Itada-state-machine does after its Glue jobs, and fails on the first
+function error so the workflow run fails with it.
+"""
+import json
+import sys
+
+import boto3
+from awsglue.utils import getResolvedOptions
+from botocore.config import Config
+
+# Above the 900s Lambda timeout, a synchronous invoke waits for the function
+LAMBDA_CLIENT_CONFIG = Config(read_timeout=910, retries={'mode': 'standard'})
+
+
+def main():
+    args = getResolvedOptions(sys.argv, ['FUNCTION_NAMES'])
+    lambda_client = boto3.client('lambda', config=LAMBDA_CLIENT_CONFIG)
+
+    for function_name in args['FUNCTION_NAMES'].split(','):
+        print(f'Invoking {function_name}')
+        response = lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='RequestResponse',
+            Payload=b'{}'
+        )
+        payload = response['Payload'].read().decode('utf-8')
+        if 'FunctionError' in response:
+            raise RuntimeError(f'{function_name} failed: {payload}')
+        print(f'{function_name} returned {json.dumps(payload)}')
+
+
+if __name__ == '__main__':
+    main()
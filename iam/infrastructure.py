@@ -128,6 +128,28 @@ class Iam(Construct):
             policy_name='LambdaStopInstance'
         )
 
+        # State machines with X-Ray tracing enabled send their segments as this role
+        step_function_xray = iam.Policy(
+            self,
+            'StepFunctionXrayPolicy',
+            document=iam.PolicyDocument(
+                assign_sids=True,
+                statements=[
+                    iam.PolicyStatement(
+                        actions=[
+                            'xray:PutTraceSegments',
+                            'xray:PutTelemetryRecords',
+                            'xray:GetSamplingRules',
+                            'xray:GetSamplingTargets'
+                        ],
+                        effect=iam.Effect.ALLOW,
+                        resources=['*']
+                    )
+                ]
+            ),
+            policy_name='StepFunctionXray'
+        )
+
         # Role
         ec2instance_role = iam.Role(self, 'Ec2InstanceRole',
             assumed_by=iam.ServicePrincipal('ec2.amazonaws.com'),
@@ -182,6 +204,7 @@ class Iam(Construct):
                 aws_lambda_role
             ]
         )
+        stepfunction_role.attach_inline_policy(step_function_xray)
         stepfunction_role.apply_removal_policy(RemovalPolicy.DESTROY)
 
         # Configuration parameters
@@ -1,18 +1,88 @@
 import os
-from typing import List, TypedDict
+from typing import Dict, List, Optional, TypedDict
 from aws_cdk import (
+    ArnFormat,
+    CfnMapping,
     RemovalPolicy,
     Duration,
+    Stack,
     aws_iam as iam,
     aws_ec2 as ec2,
+    aws_applicationautoscaling as appscaling,
+    aws_events as events,
     aws_lambda as lambda_,
-    aws_s3 as s3
+    aws_lambda_destinations as destinations,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_s3 as s3,
+    aws_sam as sam,
+    aws_secretsmanager as secretsmanager,
+    aws_sqs as sqs
 )
 from constructs import Construct
 
 
 class LambdaConfig(TypedDict):
-    pass
+    functions: Dict[str, lambda_.Function]
+    aliases: Dict[str, lambda_.Alias]
+    layers: Dict[str, lambda_.LayerVersion]
+    power_tuning_state_machine_arn: Optional[str]
+
+
+# Oldest runtime a function may use, older ones start slower and lack SnapStart
+MINIMUM_PYTHON_VERSION = (3, 12)
+
+# Each layer is packaged from LAYERS_DIR/<directory>/python, built from the
+# requirements.txt next to it (see README). Layers are versioned by the hash
+# of the built files, so a rebuild for another platform or Python version
+# publishes a new layer version while an identical build reuses the last one.
+LAYERS_DIR = os.path.join(os.path.dirname(__file__), 'layers')
+
+# AWS Lambda Power Tuning, runs a function at each memory size in PowerValues
+# and reports the measured duration and cost of every configuration.
+# Deployed unless the 'lambda_power_tuning' context value is false
+POWER_TUNING_APPLICATION = {
+    'application_id': 'arn:aws:serverlessrepo:us-east-1:451282441545:applications/aws-lambda-power-tuning',
+    'semantic_version': '4.3.4'
+}
+POWER_TUNING_VALUES = [128, 256, 512, 1024, 1536, 2048, 3008]
+
+# Powertools for AWS Lambda (Python), its Logger, Tracer and Metrics read the
+# POWERTOOLS_* variables, so handlers emit structured logs, cold-start and
+# custom metrics in embedded metric format without per-function setup.
+# Applied unless the 'lambda_instrumentation' context value is false
+INSTRUMENTATION = {
+    'metrics_namespace': 'Itada',
+    'default_log_level': 'INFO',
+    # AWS-published layer, one build per architecture
+    'powertools_layer': {
+        'account': '017000801446',
+        'layer_name': 'AWSLambdaPowertoolsPythonV3-python312-{architecture}',
+        'version': 7
+    }
+}
+
+# AWS Parameters and Secrets Lambda Extension, serves secrets from a local cache
+# on localhost:2773 so handlers only call Secrets Manager once per TTL.
+# Functions with a 'secrets' entry get the layer and <NAME>_SECRET_ARN variables
+SECRETS_EXTENSION = {
+    'cache_ttl_secs': 300,
+    'version': 11,
+    'layer_names': {
+        'x86_64': 'AWS-Parameters-and-Secrets-Lambda-Extension',
+        'arm64': 'AWS-Parameters-and-Secrets-Lambda-Extension-Arm64'
+    },
+    # The extension is published from a different account in each region
+    'accounts': {
+        'us-east-1': '177933569100',
+        'us-east-2': '590474943231',
+        'us-west-2': '345057560386',
+        'eu-west-1': '015030872274',
+        'eu-central-1': '187925254637',
+        'ap-northeast-1': '133490724326',
+        'ap-southeast-1': '044395824272',
+        'ap-southeast-2': '665172237481'
+    }
+}
 
 
 class Lambda(Construct):
@@ -24,63 +94,214 @@ class Lambda(Construct):
         cdkscripts_bucket: s3.Bucket,
         lambdafunc_role: iam.Role,
         security_groups: List[ec2.SecurityGroup],
-        vpc: ec2.Vpc
+        vpc: ec2.Vpc,
+        queues: Dict[str, sqs.Queue],
+        secrets: Dict[str, secretsmanager.ISecret]
     ):
         super().__init__(scope, id)
 
+        # Layer
+        layer_configs = {
+            'DbDriversLayer': {
+                'layer_version_name': 'itada-db-drivers',
+                'directory': 'db_drivers',
+                'description': 'Postgres drivers shared by the database functions',
+                'compatible_runtimes': [lambda_.Runtime.PYTHON_3_12],
+                'compatible_architectures': [lambda_.Architecture.X86_64]
+            },
+            'ItadaUtilsLayer': {
+                'layer_version_name': 'itada-utils',
+                'directory': 'itada_utils',
+                'description': 'data_lineage and etl_utils helpers shared with the Glue jobs',
+                'compatible_runtimes': [lambda_.Runtime.PYTHON_3_12],
+                'compatible_architectures': [lambda_.Architecture.X86_64, lambda_.Architecture.ARM_64]
+            }
+        }
+
+        layers: Dict[str, lambda_.LayerVersion] = {}
+        for layer_id, layer_props in layer_configs.items():
+            layer_dir = os.path.join(LAYERS_DIR, layer_props['directory'])
+            # Functions would deploy without their dependencies and fail on import
+            if not os.path.isdir(os.path.join(layer_dir, 'python')):
+                raise ValueError(
+                    f'Lambda layer {layer_props["layer_version_name"]} is not built, '
+                    f'build {layer_dir}/python before synth (see README)'
+                )
+
+            layers[layer_props['layer_version_name']] = lambda_.LayerVersion(
+                self,
+                layer_id,
+                code=lambda_.Code.from_asset(
+                    layer_dir,
+                    exclude=['requirements.txt', '.gitignore']
+                ),
+                compatible_architectures=layer_props['compatible_architectures'],
+                compatible_runtimes=layer_props['compatible_runtimes'],
+                description=layer_props['description'],
+                layer_version_name=layer_props['layer_version_name'],
+                removal_policy=RemovalPolicy.RETAIN
+            )
+
+        # Function
         lambda_func_configs = {
             'TriggerCsvUploadSfLambdaFunc': {
                 'description': '',
-                'runtime': lambda_.Runtime.PYTHON_3_8,
+                'runtime': lambda_.Runtime.PYTHON_3_12,
                 'function_name': 'trigger-csv-upload-sf',
-                'timeout_secs': 60
+                'memory_size': 128,
+                'architecture': lambda_.Architecture.ARM_64,
+                'timeout_secs': 60,
+                # One invocation, and one state machine execution, per batch of uploaded files.
+                # The handler receives an SQS batch ({'Records': [...]}, each body an S3 event)
+                # instead of the S3 event itself, and returns {'batchItemFailures': [...]}
+                # with the messageId of every record to retry (see README).
+                # STATE_MACHINE_EXECUTION is 'sync': start executions with StartSyncExecution,
+                # StartExecution is rejected for them, and they must finish within this timeout
+                'sqs_event_source': {
+                    'queue_name': 'csv-upload-queue',
+                    'batch_size': 100,
+                    'max_batching_window_secs': 30
+                }
             },
             'AuroraSyncFunc': {
                 'description': '',
-                'runtime': lambda_.Runtime.PYTHON_3_7,
+                'runtime': lambda_.Runtime.PYTHON_3_12,
                 'function_name': 'aurora-sync',
-                'timeout_secs': 183
+                'memory_size': 256,
+                'architecture': lambda_.Architecture.X86_64,
+                'timeout_secs': 183,
+                'layers': ['itada-db-drivers'],
+                'snap_start': True,
+                'secrets': ['aurora']
             },
             'QueryDataLineageFunc': {
                 'description': 'An Amazon SNS trigger that logs the message pushed to the SNS topic.',
-                'runtime': lambda_.Runtime.PYTHON_3_7,
+                'runtime': lambda_.Runtime.PYTHON_3_12,
                 'function_name': 'query-data-lineage',
-                'timeout_secs': 210
+                'memory_size': 512,
+                'architecture': lambda_.Architecture.X86_64,
+                'timeout_secs': 210,
+                'layers': ['itada-db-drivers', 'itada-utils'],
+                'reserved_concurrency': 20,
+                # Interactive and high volume, only problems are logged
+                'log_level': 'WARNING',
+                # Interactive lookups, kept warm on the 'live' alias. Only invocations of the
+                # alias use it, so the SNS subscription (managed outside this stack) must
+                # target query-data-lineage:live, see README. Schedules are in UTC
+                'provisioned_concurrency': {
+                    'min_capacity': 1,
+                    'max_capacity': 5,
+                    'utilization_target': 0.7,
+                    'schedules': {
+                        'BusinessHours': {
+                            'schedule': 'cron(0 22 ? * SUN-THU *)',
+                            'min_capacity': 2
+                        },
+                        'AfterHours': {
+                            'schedule': 'cron(0 9 ? * MON-FRI *)',
+                            'min_capacity': 1
+                        }
+                    }
+                },
+                'invoked_by': ['sns.amazonaws.com'],
+                'secrets': ['aurora']
             },
             'ResourceCleanupFunc': {
                 'description': '',
-                'runtime': lambda_.Runtime.PYTHON_3_9,
+                'runtime': lambda_.Runtime.PYTHON_3_12,
                 'function_name': 'resource-cleanup',
-                'timeout_secs': 3
+                'memory_size': 128,
+                'architecture': lambda_.Architecture.ARM_64,
+                'timeout_secs': 3,
+                'reserved_concurrency': 5,
+                # A stale cleanup is superseded by the next one, so it is dropped rather than retried
+                'async_invocation': {
+                    'max_event_age_secs': 60,
+                    'retry_attempts': 0,
+                    'on_failure': {'type': 'sqs', 'name': 'lambda-async-failure-queue'}
+                }
             },
             'ReloadAppBackendDataFunc': {
                 'description': '',
-                'runtime': lambda_.Runtime.PYTHON_3_8,
+                'runtime': lambda_.Runtime.PYTHON_3_12,
                 'function_name': 'reload-app-backend-data',
-                'timeout_secs': 3
+                'memory_size': 128,
+                'architecture': lambda_.Architecture.ARM_64,
+                'timeout_secs': 3,
+                'reserved_concurrency': 2,
+                'async_invocation': {
+                    'max_event_age_secs': 300,
+                    'retry_attempts': 1,
+                    'on_success': {'type': 'event_bus', 'name': 'default'},
+                    'on_failure': {'type': 'sqs', 'name': 'lambda-async-failure-queue'}
+                }
             },
             'DevelopPostgresRawDataValidationFunc': {
                 'description': '',
-                'runtime': lambda_.Runtime.PYTHON_3_7,
+                'runtime': lambda_.Runtime.PYTHON_3_12,
                 'function_name': 'develop-postgres-raw-data-validation',
-                'timeout_secs': 900
+                'memory_size': 1024,
+                'architecture': lambda_.Architecture.X86_64,
+                'timeout_secs': 900,
+                'layers': ['itada-db-drivers', 'itada-utils'],
+                'log_level': 'DEBUG',
+                'reserved_concurrency': 2,
+                'snap_start': True,
+                'secrets': ['aurora']
             },
             'DevelopRedshiftFunc': {
                 'description': '',
-                'runtime': lambda_.Runtime.PYTHON_3_7,
+                'runtime': lambda_.Runtime.PYTHON_3_12,
                 'function_name': 'develop-redshift',
-                'timeout_secs': 140
+                'memory_size': 256,
+                'architecture': lambda_.Architecture.X86_64,
+                'timeout_secs': 140,
+                'layers': ['itada-db-drivers'],
+                'snap_start': True,
+                'secrets': ['redshift'],
+                # Warehouse credentials rotate rarely, a longer TTL means fewer lookups
+                'secrets_cache_ttl_secs': 900
             },
             'CsvUploadCrawlerFunc': {
                 'description': '',
-                'runtime': lambda_.Runtime.PYTHON_3_8,
+                'runtime': lambda_.Runtime.PYTHON_3_12,
                 'function_name': 'csv-upload-crawler',
+                'memory_size': 128,
+                'architecture': lambda_.Architecture.ARM_64,
                 'timeout_secs': 60
             }
         }
 
+        instrumentation = self.node.try_get_context('lambda_instrumentation') in (None, True, 'true')
+
+        functions: Dict[str, lambda_.Function] = {}
+        aliases: Dict[str, lambda_.Alias] = {}
         for lambda_func_id, lambda_func_props in lambda_func_configs.items():
-            lambda_.Function(
+            _check_runtime(lambda_func_props)
+
+            environment = {}
+
+            function_layers = [layers[layer_name] for layer_name in lambda_func_props.get('layers', [])]
+            if instrumentation:
+                environment.update({
+                    'POWERTOOLS_SERVICE_NAME': lambda_func_props['function_name'],
+                    'POWERTOOLS_METRICS_NAMESPACE': INSTRUMENTATION['metrics_namespace'],
+                    'POWERTOOLS_LOG_LEVEL': lambda_func_props.get('log_level', INSTRUMENTATION['default_log_level'])
+                })
+                function_layers.append(self._powertools_layer(lambda_func_props['architecture']))
+
+            if lambda_func_props.get('secrets'):
+                for secret_name in lambda_func_props['secrets']:
+                    environment[secret_name.upper() + '_SECRET_ARN'] = secrets[secret_name].secret_arn
+                environment.update({
+                    'PARAMETERS_SECRETS_EXTENSION_CACHE_ENABLED': 'true',
+                    'SECRETS_MANAGER_TTL': str(
+                        lambda_func_props.get('secrets_cache_ttl_secs', SECRETS_EXTENSION['cache_ttl_secs'])
+                    )
+                })
+                function_layers.append(self._secrets_extension_layer(lambda_func_props['architecture']))
+
+            functions[lambda_func_props['function_name']] = lambda_.Function(
                 self,
                 lambda_func_id,
                 code=lambda_.Code.from_bucket(
@@ -89,20 +310,196 @@ class Lambda(Construct):
                 ),
                 handler='lambda_function.lambda_handler',
                 runtime=lambda_func_props['runtime'],
+                architecture=lambda_func_props['architecture'],
                 description=lambda_func_props['description'],
-                environment={},
+                environment=environment,
                 function_name=lambda_func_props['function_name'],
+                # Shared dependencies come from layers, the function package only holds its handler
+                layers=function_layers,
+                memory_size=lambda_func_props['memory_size'],
+                reserved_concurrent_executions=lambda_func_props.get('reserved_concurrency'),
                 role=lambdafunc_role,
                 security_groups=security_groups,
+                # SnapStart snapshots published versions, so callers must invoke the 'live' alias
+                snap_start=lambda_.SnapStartConf.ON_PUBLISHED_VERSIONS if lambda_func_props.get('snap_start') else None,
                 timeout=Duration.seconds(lambda_func_props['timeout_secs']),
+                tracing=lambda_.Tracing.ACTIVE if instrumentation else lambda_.Tracing.DISABLED,
                 vpc=vpc,
                 vpc_subnets=ec2.SubnetSelection(
-                    subnet_type=ec2.SubnetType.PRIVATE_WITH_NAT
+                    subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+                )
+            )
+            functions[lambda_func_props['function_name']].apply_removal_policy(RemovalPolicy.DESTROY)
+
+            if 'sqs_event_source' in lambda_func_props:
+                event_source_props = lambda_func_props['sqs_event_source']
+                functions[lambda_func_props['function_name']].add_event_source(
+                    lambda_event_sources.SqsEventSource(
+                        queues[event_source_props['queue_name']],
+                        batch_size=event_source_props['batch_size'],
+                        max_batching_window=Duration.seconds(event_source_props['max_batching_window_secs']),
+                        report_batch_item_failures=True
+                    )
+                )
+
+            if 'provisioned_concurrency' in lambda_func_props or lambda_func_props.get('snap_start'):
+                aliases[lambda_func_props['function_name']] = self._create_live_alias(
+                    lambda_func_id,
+                    functions[lambda_func_props['function_name']],
+                    lambda_func_props.get('provisioned_concurrency')
+                )
+                # Services outside this stack that invoke the alias, limited to this account
+                for principal in lambda_func_props.get('invoked_by', []):
+                    aliases[lambda_func_props['function_name']].add_permission(
+                        principal.split('.')[0].title() + 'Invoke',
+                        principal=iam.ServicePrincipal(principal),
+                        source_account=Stack.of(self).account
+                    )
+
+            if 'async_invocation' in lambda_func_props:
+                # Applies to the alias when callers invoke one, the unqualified function otherwise
+                invoke_target = aliases.get(
+                    lambda_func_props['function_name'],
+                    functions[lambda_func_props['function_name']]
                 )
-            ).apply_removal_policy(RemovalPolicy.DESTROY)
-        
+                async_props = lambda_func_props['async_invocation']
+                invoke_target.configure_async_invoke(
+                    max_event_age=Duration.seconds(async_props['max_event_age_secs']),
+                    retry_attempts=async_props['retry_attempts'],
+                    on_success=self._async_destination(async_props.get('on_success'), queues),
+                    on_failure=self._async_destination(async_props.get('on_failure'), queues)
+                )
+
+        # Power tuning
+        power_tuning_state_machine_arn = None
+        if self.node.try_get_context('lambda_power_tuning') in (None, True, 'true'):
+            power_tuning = sam.CfnApplication(
+                self,
+                'PowerTuningApplication',
+                location=sam.CfnApplication.ApplicationLocationProperty(**POWER_TUNING_APPLICATION),
+                parameters={
+                    'lambdaResource': Stack.of(self).format_arn(
+                        service='lambda',
+                        resource='function',
+                        resource_name='*',
+                        arn_format=ArnFormat.COLON_RESOURCE_NAME
+                    ),
+                    'PowerValues': ','.join(str(memory_size) for memory_size in POWER_TUNING_VALUES),
+                    'stateMachineNamePrefix': 'itada-power-tuning'
+                }
+            )
+            power_tuning.apply_removal_policy(RemovalPolicy.DESTROY)
+            power_tuning_state_machine_arn = power_tuning.get_att('Outputs.StateMachineARN').to_string()
+
         # Configuration parameters
-        self._config: LambdaConfig = {}
+        self._config: LambdaConfig = {
+            'functions': functions,
+            'aliases': aliases,
+            'layers': layers,
+            'power_tuning_state_machine_arn': power_tuning_state_machine_arn
+        }
+
+    def _async_destination(
+        self,
+        destination_props: Optional[dict],
+        queues: Dict[str, sqs.Queue]
+    ) -> Optional[lambda_.IDestination]:
+        if not destination_props:
+            return None
+        if destination_props['type'] == 'sqs':
+            return destinations.SqsDestination(queues[destination_props['name']])
+        if destination_props['type'] == 'event_bus':
+            bus_id = 'EventBus' + destination_props['name'].title().replace('-', '')
+            event_bus = self.node.try_find_child(bus_id) or events.EventBus.from_event_bus_name(
+                self,
+                bus_id,
+                destination_props['name']
+            )
+            return destinations.EventBridgeDestination(event_bus)
+        raise ValueError(f'Unknown async invocation destination type {destination_props["type"]!r}')
+
+    def _powertools_layer(self, architecture: lambda_.Architecture) -> lambda_.ILayerVersion:
+        layer_id = 'PowertoolsLayer' + architecture.name.replace('_', '').capitalize()
+        existing = self.node.try_find_child(layer_id)
+        if existing:
+            return existing
+
+        layer_props = INSTRUMENTATION['powertools_layer']
+        layer_name = layer_props['layer_name'].format(architecture=architecture.name)
+        return lambda_.LayerVersion.from_layer_version_arn(
+            self,
+            layer_id,
+            layer_version_arn=Stack.of(self).format_arn(
+                service='lambda',
+                account=layer_props['account'],
+                resource='layer',
+                resource_name=f'{layer_name}:{layer_props["version"]}',
+                arn_format=ArnFormat.COLON_RESOURCE_NAME
+            )
+        )
+
+    def _secrets_extension_layer(self, architecture: lambda_.Architecture) -> lambda_.ILayerVersion:
+        layer_id = 'SecretsExtensionLayer' + architecture.name.replace('_', '').capitalize()
+        existing = self.node.try_find_child(layer_id)
+        if existing:
+            return existing
+
+        accounts = self.node.try_find_child('SecretsExtensionAccounts') or CfnMapping(
+            self,
+            'SecretsExtensionAccounts',
+            mapping={
+                region: {'account': account}
+                for region, account in SECRETS_EXTENSION['accounts'].items()
+            }
+        )
+        layer_name = SECRETS_EXTENSION['layer_names'][architecture.name]
+        return lambda_.LayerVersion.from_layer_version_arn(
+            self,
+            layer_id,
+            layer_version_arn=Stack.of(self).format_arn(
+                service='lambda',
+                account=accounts.find_in_map(Stack.of(self).region, 'account'),
+                resource='layer',
+                resource_name=f'{layer_name}:{SECRETS_EXTENSION["version"]}',
+                arn_format=ArnFormat.COLON_RESOURCE_NAME
+            )
+        )
+
+    def _create_live_alias(
+        self,
+        lambda_func_id: str,
+        function: lambda_.Function,
+        provisioned_concurrency: Optional[dict]
+    ) -> lambda_.Alias:
+        alias = lambda_.Alias(
+            self,
+            lambda_func_id + 'LiveAlias',
+            alias_name='live',
+            version=function.current_version,
+            provisioned_concurrent_executions=(
+                provisioned_concurrency['min_capacity'] if provisioned_concurrency else None
+            )
+        )
+
+        # Without a ceiling the provisioned concurrency stays fixed at min_capacity
+        if provisioned_concurrency and 'max_capacity' in provisioned_concurrency:
+            scaling = alias.add_auto_scaling(
+                min_capacity=provisioned_concurrency['min_capacity'],
+                max_capacity=provisioned_concurrency['max_capacity']
+            )
+            if 'utilization_target' in provisioned_concurrency:
+                scaling.scale_on_utilization(
+                    utilization_target=provisioned_concurrency['utilization_target']
+                )
+            for schedule_id, schedule_props in provisioned_concurrency.get('schedules', {}).items():
+                scaling.scale_on_schedule(
+                    schedule_id,
+                    schedule=appscaling.Schedule.expression(schedule_props['schedule']),
+                    min_capacity=schedule_props.get('min_capacity'),
+                    max_capacity=schedule_props.get('max_capacity')
+                )
+
+        return alias
 
     @property
     def config(self) -> LambdaConfig:
@@ -111,3 +508,17 @@ class Lambda(Construct):
     @config.setter
     def config(self, value):
         self._config = value
+
+
+def _check_runtime(lambda_func_props: dict) -> None:
+    runtime_name = lambda_func_props['runtime'].name
+    version = tuple(int(part) for part in runtime_name[len('python'):].split('.'))
+    if version < MINIMUM_PYTHON_VERSION:
+        raise ValueError(
+            f'{lambda_func_props["function_name"]} runs on {runtime_name}, '
+            f'python{".".join(map(str, MINIMUM_PYTHON_VERSION))} or later is required'
+        )
+    if lambda_func_props.get('snap_start') and 'provisioned_concurrency' in lambda_func_props:
+        raise ValueError(
+            f'{lambda_func_props["function_name"]} cannot combine SnapStart with provisioned concurrency'
+        )
@@ -1,9 +1,11 @@
+import json
 import os
 from typing import TypedDict, List
 from aws_cdk import (
     RemovalPolicy,
     CfnTag,
-    aws_redshift as redshift
+    aws_redshift as redshift,
+    aws_secretsmanager as secretsmanager
 )
 from constructs import Construct
 
@@ -12,6 +14,7 @@ class RedshiftConfig(TypedDict):
     attr_endpoint_address: str
     attr_endpoint_port: str
     db_name: str
+    secret: secretsmanager.ISecret
 
 
 class Redshift(Construct):
@@ -34,13 +37,33 @@ class Redshift(Construct):
             tags=[CfnTag(key='Name', value='redshift-cluster-subnet-group')]
         ).apply_removal_policy(RemovalPolicy.DESTROY)
 
+        # Master credentials, only the password is generated. The username stays a
+        # literal since changing MasterUsername replaces the cluster
+        master_username = os.getenv('DEVELOPREDSHIFT_USERNAME') or 'awsuser'
+        redshift_secret = secretsmanager.Secret(
+            self,
+            'RedshiftClusterSecret',
+            description='Master credentials for itada-redshift-cluster',
+            generate_secret_string=secretsmanager.SecretStringGenerator(
+                secret_string_template=json.dumps({
+                    'username': master_username
+                }),
+                generate_string_key='password',
+                # Characters Redshift does not accept in a master password
+                exclude_characters='"\'\\/@ ',
+                password_length=32
+            ),
+            removal_policy=RemovalPolicy.DESTROY,
+            secret_name='itada-redshift-cluster-credentials'
+        )
+
         redshift_cluster = redshift.CfnCluster(
             self,
             'RedshiftCluster',
             cluster_type='multi-node',
             db_name='dev',
-            master_username=os.getenv('DEVELOPREDSHIFT_USERNAME'),
-            master_user_password=os.getenv('DEVELOPREDSHIFT_USERPW'),
+            master_username=master_username,
+            master_user_password=redshift_secret.secret_value_from_json('password').unsafe_unwrap(),
             node_type='dc2.large',
             cluster_identifier='itada-redshift-cluster',
             cluster_subnet_group_name='redshift-cluster-subnet-group',
@@ -50,11 +73,21 @@ class Redshift(Construct):
         )
         redshift_cluster.apply_removal_policy(RemovalPolicy.DESTROY)
 
+        # Adds the cluster host and port to the secret
+        secretsmanager.CfnSecretTargetAttachment(
+            self,
+            'RedshiftClusterSecretAttachment',
+            secret_id=redshift_secret.secret_arn,
+            target_id=redshift_cluster.ref,
+            target_type='AWS::Redshift::Cluster'
+        ).apply_removal_policy(RemovalPolicy.DESTROY)
+
         # Configuration parameters
         self._config: RedshiftConfig = {
             'attr_endpoint_address': redshift_cluster.attr_endpoint_address,
             'attr_endpoint_port': redshift_cluster.attr_endpoint_port,
-            'db_name': redshift_cluster.db_name
+            'db_name': redshift_cluster.db_name,
+            'secret': redshift_secret
         }
 
     @property
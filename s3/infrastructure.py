@@ -8,6 +8,9 @@ from constructs import Construct
 
 class S3Config(TypedDict):
     itada_cdk_scripts: s3.Bucket
+    itada_datasource: s3.Bucket
+    glue_datasource: s3.IBucket
+    metadata_center: s3.Bucket
 
 
 class S3(Construct):
@@ -26,7 +29,7 @@ class S3(Construct):
         )
 
         # itada-datasource
-        s3.Bucket(
+        itada_datasource = s3.Bucket(
             self,
             'ItadaDatasourceBucket',
             bucket_name='itada-datasource-temp',
@@ -34,8 +37,15 @@ class S3(Construct):
             auto_delete_objects=True
         )
 
+        # itada-datasource read and written by the Glue jobs, created outside this stack
+        glue_datasource = s3.Bucket.from_bucket_name(
+            self,
+            'GlueDatasourceBucket',
+            bucket_name='itada-datasource'
+        )
+
         # metadata-center
-        s3.Bucket(
+        metadata_center = s3.Bucket(
             self,
             'MetadataCenterBucket',
             bucket_name='metadata-center-temp',
@@ -54,7 +64,10 @@ class S3(Construct):
 
         # Configuration parameters
         self._config: S3Config = {
-            'itada_cdk_scripts': itada_cdk_scripts
+            'itada_cdk_scripts': itada_cdk_scripts,
+            'itada_datasource': itada_datasource,
+            'glue_datasource': glue_datasource,
+            'metadata_center': metadata_center
         }
 
     @property
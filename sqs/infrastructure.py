@@ -0,0 +1,97 @@
+from typing import Dict, TypedDict
+from aws_cdk import (
+    RemovalPolicy,
+    Duration,
+    aws_s3 as s3,
+    aws_s3_notifications as s3n,
+    aws_sqs as sqs
+)
+from constructs import Construct
+
+
+class SqsConfig(TypedDict):
+    queues: Dict[str, sqs.Queue]
+
+
+class Sqs(Construct):
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        *,
+        glue_datasource: s3.IBucket
+    ):
+        super().__init__(scope, id)
+
+        # Queue
+        # Entries with a 'notification' receive S3 ObjectCreated events from itada-datasource,
+        # the bucket the Glue jobs read uploads from
+        queue_configs = {
+            'CsvUploadQueue': {
+                'queue_name': 'csv-upload-queue',
+                # Above six times the consuming function timeout plus its batching window
+                # (6 x 60s + 30s), as Lambda recommends
+                'visibility_timeout_secs': 420,
+                'dead_letter_queue': {
+                    'queue_name': 'csv-upload-dlq',
+                    'max_receive_count': 3
+                },
+                'notification': {
+                    'prefix': 'upload/raw/csv/',
+                    'suffix': '.csv'
+                }
+            },
+            # On-failure destination for asynchronous Lambda invocations that ran out of retries
+            'LambdaAsyncFailureQueue': {
+                'queue_name': 'lambda-async-failure-queue',
+                'visibility_timeout_secs': 30,
+                'retention_days': 14
+            }
+        }
+
+        queues: Dict[str, sqs.Queue] = {}
+        for queue_id, queue_props in queue_configs.items():
+            dead_letter_queue = None
+            if 'dead_letter_queue' in queue_props:
+                dead_letter_queue = sqs.DeadLetterQueue(
+                    max_receive_count=queue_props['dead_letter_queue']['max_receive_count'],
+                    queue=sqs.Queue(
+                        self,
+                        queue_id + 'Dlq',
+                        queue_name=queue_props['dead_letter_queue']['queue_name'],
+                        removal_policy=RemovalPolicy.DESTROY,
+                        retention_period=Duration.days(14)
+                    )
+                )
+
+            queues[queue_props['queue_name']] = sqs.Queue(
+                self,
+                queue_id,
+                dead_letter_queue=dead_letter_queue,
+                queue_name=queue_props['queue_name'],
+                removal_policy=RemovalPolicy.DESTROY,
+                retention_period=(
+                    Duration.days(queue_props['retention_days']) if 'retention_days' in queue_props else None
+                ),
+                visibility_timeout=Duration.seconds(queue_props['visibility_timeout_secs'])
+            )
+
+            if 'notification' in queue_props:
+                glue_datasource.add_event_notification(
+                    s3.EventType.OBJECT_CREATED,
+                    s3n.SqsDestination(queues[queue_props['queue_name']]),
+                    s3.NotificationKeyFilter(**queue_props['notification'])
+                )
+
+        # Configuration parameters
+        self._config: SqsConfig = {
+            'queues': queues
+        }
+
+    @property
+    def config(self) -> SqsConfig:
+        return self._config
+
+    @config.setter
+    def config(self, value):
+        self._config = value
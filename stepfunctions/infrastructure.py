@@ -1,14 +1,88 @@
-from typing import TypedDict
+from typing import Dict, List, Optional, TypedDict
 from aws_cdk import (
+    ArnFormat,
     RemovalPolicy,
+    Duration,
+    Stack,
+    aws_glue as glue,
+    aws_iam as iam,
+    aws_lambda as lambda_,
     aws_logs as logs,
-    aws_stepfunctions as stepfunctions
+    aws_s3 as s3,
+    aws_stepfunctions as stepfunctions,
+    aws_stepfunctions_tasks as tasks
 )
 from constructs import Construct
+from glue.infrastructure import JobCapacity
 
 
 class StepfunctionsConfig(TypedDict):
-    pass
+    state_machines: Dict[str, stepfunctions.CfnStateMachine]
+
+
+class StateMachineLogging(TypedDict, total=False):
+    log_level: str
+    include_execution_data: bool
+    log_retention: logs.RetentionDays
+    tracing: bool
+
+
+# Retry policies of code-defined state machines
+GLUE_JOB_RETRY = {
+    'errors': ['Glue.ConcurrentRunsExceededException', 'Glue.InternalServiceException', 'Glue.ThrottlingException'],
+    'interval': Duration.seconds(60),
+    'backoff_rate': 2,
+    'max_attempts': 3
+}
+S3_CALL_RETRY = {
+    'errors': ['S3.S3Exception', 'S3.SdkClientException'],
+    'interval': Duration.seconds(1),
+    'backoff_rate': 2,
+    'max_attempts': 5
+}
+LAMBDA_INVOKE_RETRY = {
+    'errors': [
+        'Lambda.ServiceException',
+        'Lambda.AWSLambdaException',
+        'Lambda.SdkClientException',
+        'Lambda.TooManyRequestsException'
+    ],
+    'interval': Duration.seconds(2),
+    'backoff_rate': 2,
+    'max_attempts': 6
+}
+
+# EXPRESS workflows only support request-response integrations and run for at most 5 minutes
+EXPRESS_UNSUPPORTED_RESOURCE_SUFFIXES = ('.sync', '.sync:2', '.waitForTaskToken')
+EXPRESS_MAX_DURATION_SECS = 300
+
+# Logging and tracing of a state machine, from lowest to highest precedence:
+# the deployment environment (the 'environment' context value, 'dev' when unset),
+# the state machine type, then the 'logging' entry of its step_func_configs entry
+ENVIRONMENT_LOGGING: Dict[str, StateMachineLogging] = {
+    'dev': {
+        'log_level': 'ALL',
+        'include_execution_data': True,
+        'log_retention': logs.RetentionDays.ONE_WEEK,
+        'tracing': False
+    },
+    'prod': {
+        'log_level': 'ERROR',
+        'include_execution_data': False,
+        'log_retention': logs.RetentionDays.ONE_MONTH,
+        'tracing': True
+    }
+}
+# Express workflows run at high rates, so they only log failures, without payloads, and keep logs briefly
+STATE_MACHINE_TYPE_DEFAULTS: Dict[str, StateMachineLogging] = {
+    'STANDARD': {},
+    'EXPRESS': {
+        'log_level': 'ERROR',
+        'include_execution_data': False,
+        'log_retention': logs.RetentionDays.THREE_DAYS,
+        'tracing': True
+    }
+}
 
 
 class Stepfunctions(Construct):
@@ -17,36 +91,128 @@ class Stepfunctions(Construct):
         scope: Construct,
         id: str,
         *,
-        stepfunction_role_arn: str
+        stepfunction_role_arn: str,
+        glue_jobs: Dict[str, glue.CfnJob],
+        glue_job_capacity: Dict[str, JobCapacity],
+        glue_pipeline_branches: Dict[str, List[str]],
+        lambda_functions: Dict[str, lambda_.Function],
+        lambda_aliases: Dict[str, lambda_.Alias],
+        glue_datasource: s3.IBucket
     ):
         super().__init__(scope, id)
 
+        stepfunction_role = iam.Role.from_role_arn(self, 'StepFunctionRole', stepfunction_role_arn)
+
+        self._glue_jobs = glue_jobs
+        self._glue_job_capacity = glue_job_capacity
+        self._glue_pipeline_branches = glue_pipeline_branches
+        # SnapStart functions are invoked through their 'live' alias
+        self._lambda_functions: Dict[str, lambda_.IFunction] = {**lambda_functions, **lambda_aliases}
+        self._glue_datasource = glue_datasource
+
+        # State machines with a 'definition' are built here from the Glue and Lambda
+        # constructs, the others load their definition from 'definition_s3_key'.
+        # With a 'definition_opt_in' context flag the code definition is only used
+        # when that flag is true, the S3 definition otherwise.
+        # Functions listed in 'started_by' get STATE_MACHINE_ARN and STATE_MACHINE_EXECUTION,
+        # 'sync' executions (EXPRESS only) must be started with StartSyncExecution, which
+        # returns the execution result, instead of StartExecution
         step_func_configs = {
             'CsvUploadStateMachine': {
-                'function_name': 'csv-upload-state-machine'
+                # The type of a state machine cannot change in place, the EXPRESS
+                # workflow replaces csv-upload-state-machine under a new name
+                'function_name': 'csv-upload-express-state-machine',
+                # Not checked at synth, it must only use request-response integrations
+                # (no .sync or .waitForTaskToken) and finish within 5 minutes
+                'definition_s3_key': 'step_funcs/csv-upload-state-machine.json',
+                # Short and frequent runs, one per batch of uploaded files
+                'type': 'EXPRESS',
+                'execution': 'sync',
+                'started_by': ['trigger-csv-upload-sf']
             },
             'DevelopItadaStateMachine': {
-                'function_name': 'develop-Itada-state-machine'
+                'function_name': 'develop-Itada-state-machine',
+                'definition_s3_key': 'step_funcs/develop-Itada-state-machine.json',
+                # The S3 definition stays authoritative until the code graph is verified against it
+                'definition': self._itada_pipeline_definition,
+                'definition_opt_in': 'itada_pipeline_from_code',
+                # Waits on Glue job runs for hours, beyond the EXPRESS duration limit
+                'type': 'STANDARD',
+                'execution': 'async'
+            },
+            'CsvBulkUploadStateMachine': {
+                'function_name': 'csv-bulk-upload-state-machine',
+                'definition': self._csv_bulk_upload_definition,
+                # Distributed Map runs in a STANDARD parent, its child workflows are EXPRESS
+                'type': 'STANDARD',
+                'execution': 'async',
+                # Map runs are followed per child workflow, the parent only logs failures
+                'logging': {
+                    'log_level': 'ERROR',
+                    'include_execution_data': False
+                },
+                # Started on demand (see README), in the bucket and prefix of the job's
+                # --BUCKET_NAME and --CSV_PATH
+                'distributed_map': {
+                    # Not under upload/raw/csv/, whose uploads are queued for trigger-csv-upload-sf
+                    'prefix': 'upload/bulk/csv/',
+                    # Listed files are moved under '<staging_prefix><execution name>/',
+                    # so the next run does not list them again
+                    'staging_prefix': 'upload/staged/',
+                    'result_prefix': 'upload/map-results/',
+                    'max_concurrency': 50,
+                    'max_items_per_batch': 100,
+                    'tolerated_failure_percentage': 5
+                }
+            },
+            'ItadaBackfillStateMachine': {
+                'function_name': 'itada-backfill-state-machine',
+                'definition': self._backfill_definition,
+                'type': 'STANDARD',
+                'execution': 'async',
+                # Input {"build_dates": [...]}, each job runs once per build date with
+                # as many runs at a time as its max_concurrent_runs allows. Runs are
+                # serial while the jobs keep max_concurrent_runs 1 (see Glue)
+                'backfill': {
+                    'job_names': ['itada_work_db_transformation', 'itada_dpos_db_transformation'],
+                    'items_path': '$.build_dates',
+                    'argument': '--BUILD_DATE'
+                }
             }
         }
 
+        state_machines: Dict[str, stepfunctions.CfnStateMachine] = {}
         for step_func_id, step_func_props in step_func_configs.items():
+            _check_execution(step_func_props)
+            logging = self._resolve_logging(step_func_props)
+
             log_group = logs.LogGroup(
                 self,
                 step_func_id + 'LogGroup',
                 log_group_name=f'/aws/vendedlogs/states/{step_func_props["function_name"]}-Logs',
                 removal_policy=RemovalPolicy.DESTROY,
-                retention=logs.RetentionDays.ONE_WEEK
+                retention=logging['log_retention']
             )
 
+            definition_props = {}
+            if self._uses_code_definition(step_func_props):
+                definition = step_func_props['definition'](step_func_props)
+                graph = stepfunctions.StateGraph(
+                    definition.start_state,
+                    step_func_props['function_name']
+                ).to_graph_json()
+                _check_graph(step_func_props['function_name'], graph, step_func_props['type'] == 'EXPRESS')
+                definition_props['definition_string'] = Stack.of(self).to_json_string(graph)
+            else:
+                definition_props['definition_s3_location'] = stepfunctions.CfnStateMachine.S3LocationProperty(
+                    bucket='itada-cdk-scripts',
+                    key=step_func_props['definition_s3_key']
+                )
+
             st_machine = stepfunctions.CfnStateMachine(
                 self,
                 step_func_id + 'StepFunc',
                 role_arn=stepfunction_role_arn,
-                definition_s3_location=stepfunctions.CfnStateMachine.S3LocationProperty(
-                    bucket='itada-cdk-scripts',
-                    key=f'step_funcs/{step_func_props["function_name"]}.json'
-                ),
                 logging_configuration=stepfunctions.CfnStateMachine.LoggingConfigurationProperty(
                     destinations=[
                         stepfunctions.CfnStateMachine.LogDestinationProperty(
@@ -55,16 +221,246 @@ class Stepfunctions(Construct):
                             )
                         )
                     ],
-                    include_execution_data=True,
-                    level='ALL'
+                    include_execution_data=logging['include_execution_data'],
+                    level=logging['log_level']
                 ),
                 state_machine_name=step_func_props['function_name'],
-                state_machine_type='STANDARD'
+                state_machine_type=step_func_props['type'],
+                tracing_configuration=stepfunctions.CfnStateMachine.TracingConfigurationProperty(
+                    enabled=logging['tracing']
+                ),
+                **definition_props
             )
             st_machine.apply_removal_policy(RemovalPolicy.DESTROY)
+            state_machines[step_func_props['function_name']] = st_machine
+
+            if 'distributed_map' in step_func_props:
+                # Lists and moves the files, writes the map results and starts the child workflows
+                glue_datasource.grant_read_write(stepfunction_role)
+                stepfunction_role.add_to_principal_policy(iam.PolicyStatement(
+                    actions=['states:StartExecution', 'states:DescribeExecution', 'states:StopExecution'],
+                    resources=[
+                        Stack.of(self).format_arn(
+                            service='states',
+                            resource=resource,
+                            resource_name=step_func_props['function_name'] + suffix,
+                            arn_format=ArnFormat.COLON_RESOURCE_NAME
+                        )
+                        for resource, suffix in [('stateMachine', ''), ('execution', ':*')]
+                    ]
+                ))
+
+            for function_name in step_func_props.get('started_by', []):
+                lambda_functions[function_name].add_environment('STATE_MACHINE_ARN', st_machine.attr_arn)
+                lambda_functions[function_name].add_environment(
+                    'STATE_MACHINE_EXECUTION',
+                    step_func_props['execution']
+                )
 
         # Configuration parameters
-        self._config: StepfunctionsConfig = {}
+        self._config: StepfunctionsConfig = {
+            'state_machines': state_machines
+        }
+
+    def _resolve_logging(self, step_func_props: dict) -> StateMachineLogging:
+        environment = self.node.try_get_context('environment') or 'dev'
+        if environment not in ENVIRONMENT_LOGGING:
+            raise ValueError(f'Unknown environment {environment!r}, expected one of {list(ENVIRONMENT_LOGGING)}')
+
+        return {
+            **ENVIRONMENT_LOGGING[environment],
+            **STATE_MACHINE_TYPE_DEFAULTS[step_func_props['type']],
+            **step_func_props.get('logging', {})
+        }
+
+    def _uses_code_definition(self, step_func_props: dict) -> bool:
+        if 'definition' not in step_func_props:
+            return False
+        if 'definition_opt_in' not in step_func_props:
+            return True
+        return self.node.try_get_context(step_func_props['definition_opt_in']) in (True, 'true')
+
+    def _itada_pipeline_definition(self, step_func_props: dict) -> stepfunctions.IChainable:
+        # The source pipelines are independent, each runs its jobs in order as one branch
+        sources = stepfunctions.Parallel(
+            self,
+            'TransformSources',
+            comment='work_db and dpos_db pipelines',
+            result_path=stepfunctions.JsonPath.DISCARD
+        )
+        for job_names in self._glue_pipeline_branches.values():
+            branch = stepfunctions.Chain.start(self._glue_job_task(job_names[0]))
+            for job_name in job_names[1:]:
+                branch = branch.next(self._glue_job_task(job_name))
+            sources.branch(branch)
+
+        # Raw data is validated before anything is loaded into Redshift
+        return (
+            sources
+            .next(self._lambda_invoke_task('develop-postgres-raw-data-validation'))
+            .next(self._lambda_invoke_task('develop-redshift'))
+            .next(self._lambda_invoke_task('aurora-sync'))
+        )
+
+    def _csv_bulk_upload_definition(self, step_func_props: dict) -> stepfunctions.IChainable:
+        map_props = step_func_props['distributed_map']
+        bucket_name = self._glue_datasource.bucket_name
+        run_prefix = map_props['staging_prefix'] + '{}/'
+
+        # Each child workflow moves a batch of up to 'max_items_per_batch' listed files
+        # out of the prefix, keeping their keys under the run's staging prefix
+        key = stepfunctions.JsonPath.string_at('$.key')
+        # CopySource must be URL-encoded, which only JSONata can do. Each key segment
+        # is encoded on its own so the '/' separators are kept
+        stage_file = tasks.CallAwsService.jsonata(
+            self,
+            'StageCsvFile',
+            service='s3',
+            action='copyObject',
+            parameters={
+                'Bucket': bucket_name,
+                'CopySource': "{% '" + bucket_name + "/' & "
+                              "$join($map($split($states.input.key, '/'), $encodeUrlComponent), '/') %}",
+                'Key': "{% '" + map_props['staging_prefix'] + "' & $states.input.run_id & '/' & $states.input.key %}"
+            },
+            iam_resources=[self._glue_datasource.arn_for_objects('*')],
+            outputs='{% $states.input %}'
+        )
+        stage_file.add_retry(**S3_CALL_RETRY)
+        remove_file = self._s3_call_task('RemoveListedCsvFile', 'deleteObject', {
+            'Bucket': bucket_name,
+            'Key': key
+        })
+        stage_files = stepfunctions.Map(
+            self,
+            'StageCsvFiles',
+            items_path='$.Items',
+            item_selector={
+                'key': stepfunctions.JsonPath.string_at('$$.Map.Item.Value.Key'),
+                'run_id': stepfunctions.JsonPath.string_at('$.BatchInput.run_id')
+            },
+            result_path=stepfunctions.JsonPath.DISCARD
+        )
+        stage_files.item_processor(stage_file.next(remove_file))
+        item_processor = stepfunctions.StateGraph(stage_files, 'CsvFileBatch').to_graph_json()
+        item_processor['ProcessorConfig'] = {'Mode': 'DISTRIBUTED', 'ExecutionType': 'EXPRESS'}
+
+        # DistributedMap renders a non-deprecated ResultWriter only behind a feature flag
+        process_uploads = stepfunctions.CustomState(
+            self,
+            'ProcessUploadedCsvFiles',
+            state_json={
+                'Type': 'Map',
+                'ItemReader': {
+                    'Resource': 'arn:aws:states:::s3:listObjectsV2',
+                    'Parameters': {
+                        'Bucket': bucket_name,
+                        'Prefix': map_props['prefix']
+                    }
+                },
+                'ItemBatcher': {
+                    'MaxItemsPerBatch': map_props['max_items_per_batch'],
+                    'BatchInput': {'run_id.$': '$$.Execution.Name'}
+                },
+                'ItemProcessor': item_processor,
+                'MaxConcurrency': map_props['max_concurrency'],
+                'ToleratedFailurePercentage': map_props['tolerated_failure_percentage'],
+                # Child results go to S3, a large fan-out would exceed the state payload limit
+                'ResultWriter': {
+                    'Resource': 'arn:aws:states:::s3:putObject',
+                    'Parameters': {
+                        'Bucket': bucket_name,
+                        'Prefix': map_props['result_prefix']
+                    }
+                }
+            }
+        )
+
+        # The whole staged set is handed to a single job run
+        return process_uploads.next(self._glue_job_task(
+            'itada_upload_csv_to_parquet',
+            arguments=stepfunctions.TaskInput.from_object({
+                '--CSV_PATH': stepfunctions.JsonPath.format(
+                    run_prefix + map_props['prefix'],
+                    stepfunctions.JsonPath.string_at('$$.Execution.Name')
+                )
+            })
+        ))
+
+    def _backfill_definition(self, step_func_props: dict) -> stepfunctions.IChainable:
+        backfill_props = step_func_props['backfill']
+
+        # Jobs backfill side by side, each fanning out over the build dates
+        backfill = stepfunctions.Parallel(
+            self,
+            'BackfillJobs',
+            result_path=stepfunctions.JsonPath.DISCARD
+        )
+        for job_name in backfill_props['job_names']:
+            job_id = self._glue_jobs[job_name].node.id
+            runs = stepfunctions.Map(
+                self,
+                'Backfill' + job_id,
+                items_path=backfill_props['items_path'],
+                # More would fail with ConcurrentRunsExceededException, which GLUE_JOB_RETRY retries
+                max_concurrency=self._glue_job_capacity[job_name]['max_concurrent_runs'],
+                item_selector={'item': stepfunctions.JsonPath.string_at('$$.Map.Item.Value')}
+            )
+            runs.item_processor(self._glue_job_task(
+                job_name,
+                arguments=stepfunctions.TaskInput.from_object({
+                    backfill_props['argument']: stepfunctions.JsonPath.string_at('$.item')
+                }),
+                task_id='Backfill' + job_id + 'Task'
+            ))
+            backfill.branch(runs)
+
+        return backfill
+
+    def _glue_job_task(
+        self,
+        job_name: str,
+        arguments: Optional[stepfunctions.TaskInput] = None,
+        task_id: Optional[str] = None
+    ) -> tasks.GlueStartJobRun:
+        # .sync, the state completes when the job run does
+        task = tasks.GlueStartJobRun(
+            self,
+            task_id or self._glue_jobs[job_name].node.id + 'Task',
+            glue_job_name=job_name,
+            arguments=arguments,
+            integration_pattern=stepfunctions.IntegrationPattern.RUN_JOB,
+            result_path=stepfunctions.JsonPath.DISCARD
+        )
+        task.add_retry(**GLUE_JOB_RETRY)
+        return task
+
+    def _s3_call_task(self, id: str, action: str, parameters: dict) -> tasks.CallAwsService:
+        # Request-response S3 API call, allowed in EXPRESS workflows
+        task = tasks.CallAwsService(
+            self,
+            id,
+            service='s3',
+            action=action,
+            parameters=parameters,
+            iam_resources=[self._glue_datasource.arn_for_objects('*')],
+            result_path=stepfunctions.JsonPath.DISCARD
+        )
+        task.add_retry(**S3_CALL_RETRY)
+        return task
+
+    def _lambda_invoke_task(self, function_name: str) -> tasks.LambdaInvoke:
+        function = self._lambda_functions[function_name]
+        task = tasks.LambdaInvoke(
+            self,
+            ''.join(part.title() for part in function_name.split('-')) + 'Task',
+            lambda_function=function,
+            payload_response_only=True,
+            result_path=stepfunctions.JsonPath.DISCARD,
+            retry_on_service_exceptions=False
+        )
+        task.add_retry(**LAMBDA_INVOKE_RETRY)
+        return task
 
     @property
     def config(self) -> StepfunctionsConfig:
@@ -73,3 +469,47 @@ class Stepfunctions(Construct):
     @config.setter
     def config(self, value):
         self._config = value
+
+
+def _check_execution(step_func_props: dict) -> None:
+    if step_func_props['type'] not in STATE_MACHINE_TYPE_DEFAULTS:
+        raise ValueError(
+            f'Unknown state machine type {step_func_props["type"]!r} for {step_func_props["function_name"]}'
+        )
+    if step_func_props['execution'] == 'sync' and step_func_props['type'] != 'EXPRESS':
+        raise ValueError(
+            f'{step_func_props["function_name"]} is {step_func_props["type"]}, '
+            'only EXPRESS workflows run synchronously'
+        )
+
+
+def _check_graph(state_machine_name: str, graph: dict, express: bool) -> None:
+    if express:
+        _check_express_duration(state_machine_name, 'the workflow', graph)
+
+    for state_name, state in graph['States'].items():
+        if express:
+            resource = state.get('Resource')
+            if isinstance(resource, str) and resource.endswith(EXPRESS_UNSUPPORTED_RESOURCE_SUFFIXES):
+                raise ValueError(
+                    f'{state_name} of {state_machine_name} integrates with {resource}, '
+                    'EXPRESS workflows only support request-response integrations'
+                )
+            _check_express_duration(state_machine_name, state_name, state)
+
+        for branch in state.get('Branches', []):
+            _check_graph(state_machine_name, branch, express)
+        # Distributed Map child workflows can be EXPRESS inside a STANDARD parent
+        processor = state.get('ItemProcessor') or state.get('Iterator')
+        if processor:
+            child_express = processor.get('ProcessorConfig', {}).get('ExecutionType') == 'EXPRESS'
+            _check_graph(state_machine_name, processor, express or child_express)
+
+
+def _check_express_duration(state_machine_name: str, name: str, props: dict) -> None:
+    timeout = props.get('TimeoutSeconds')
+    if isinstance(timeout, int) and timeout > EXPRESS_MAX_DURATION_SECS:
+        raise ValueError(
+            f'{name} of {state_machine_name} times out after {timeout}s, '
+            f'EXPRESS workflows run for at most {EXPRESS_MAX_DURATION_SECS}s'
+        )
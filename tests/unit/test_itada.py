@@ -1,7 +1,13 @@
+import json
+
 import aws_cdk as core
+import pytest
 import aws_cdk.assertions as assertions
 
 from development import Itada
+from glue import infrastructure as glue_infrastructure
+from lambda_ import infrastructure as lambda_infrastructure
+from stepfunctions import infrastructure as stepfunctions_infrastructure
 
 # example tests. To run these tests, uncomment this file along with the example
 # resource in resource_migration_cdk/resource_migration_cdk_stack.py
@@ -13,3 +19,954 @@ def test_sqs_queue_created():
 #     template.has_resource_properties("AWS::SQS::Queue", {
 #         "VisibilityTimeout": 300
 #     })
+
+
+@pytest.fixture(autouse=True)
+def built_lambda_layers(monkeypatch, tmp_path_factory):
+    # Synth requires every Lambda layer to be built
+    layers_dir = tmp_path_factory.mktemp("layers")
+    for directory, package in (("db_drivers", "psycopg2"), ("itada_utils", "data_lineage")):
+        (layers_dir / directory / "python" / package).mkdir(parents=True)
+        (layers_dir / directory / "python" / package / "__init__.py").write_text("")
+    monkeypatch.setattr(lambda_infrastructure, "LAYERS_DIR", str(layers_dir))
+    return layers_dir
+
+
+def synth_template(context=None):
+    app = core.App(context=context)
+    stack = Itada(app, "itada")
+    return assertions.Template.from_stack(stack)
+
+
+def state_machine_definition(template, state_machine_name):
+    # Tokens (ARNs, names) in the definition are replaced by a placeholder
+    state_machine = next(
+        resource for resource in template.find_resources("AWS::StepFunctions::StateMachine").values()
+        if resource["Properties"]["StateMachineName"] == state_machine_name
+    )
+    parts = state_machine["Properties"]["DefinitionString"]["Fn::Join"][1]
+    return json.loads("".join(part if isinstance(part, str) else "TOKEN" for part in parts))
+
+
+def test_glue_job_capacity_tiers():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_work_db_transformation",
+        "WorkerType": "G.2X",
+        "NumberOfWorkers": 16,
+        "Timeout": 480
+    })
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_upload_csv_to_parquet",
+        "WorkerType": "G.1X",
+        "NumberOfWorkers": 2,
+        "DefaultArguments": assertions.Match.object_like({
+            "--conf": assertions.Match.string_like_regexp("spark.sql.shuffle.partitions=8")
+        })
+    })
+
+
+def test_glue_job_capacity_context_overrides():
+    template = synth_template(context={
+        "glue_job_capacity": {"itada_dpos_db_raw": "shuffle_heavy", "itada_upload_csv_to_parquet": "shuffle_heavy"},
+        "glue_capacity_profiles": {"shuffle_heavy": {"number_of_workers": 12, "max_workers": 30}}
+    })
+
+    # Auto-scaled jobs get max_workers, fixed-size jobs number_of_workers
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_dpos_db_raw",
+        "WorkerType": "G.2X",
+        "NumberOfWorkers": 30
+    })
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_upload_csv_to_parquet",
+        "WorkerType": "G.2X",
+        "NumberOfWorkers": 12
+    })
+
+    with pytest.raises(Exception, match="below its number_of_workers"):
+        synth_template(context={"glue_capacity_profiles": {"standard": {"number_of_workers": 12}}})
+
+
+def test_glue_job_auto_scaling_and_flex():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_dpos_db_staging",
+        "GlueVersion": "4.0",
+        "NumberOfWorkers": 10,
+        "DefaultArguments": assertions.Match.object_like({
+            "--enable-auto-scaling": "true"
+        }),
+        "ExecutionClass": assertions.Match.absent()
+    })
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_work_db_clean",
+        "GlueVersion": "4.0",
+        "ExecutionClass": "FLEX"
+    })
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_upload_csv_to_parquet",
+        "GlueVersion": "3.0",
+        "NumberOfWorkers": 2,
+        "DefaultArguments": assertions.Match.object_like({
+            "--enable-auto-scaling": assertions.Match.absent()
+        })
+    })
+
+
+def test_glue_auto_scaled_jobs_can_grow_past_the_baseline():
+    # Every job ran on a fixed 2 G.1X workers before auto-scaling
+    baseline_workers = 2
+    template = synth_template()
+
+    auto_scaled = [
+        job["Properties"] for job in template.find_resources("AWS::Glue::Job").values()
+        if job["Properties"]["DefaultArguments"].get("--enable-auto-scaling") == "true"
+    ]
+    assert auto_scaled
+    for job in auto_scaled:
+        assert job["NumberOfWorkers"] > baseline_workers, job["Name"]
+
+
+def test_glue_workflow_runs_pipelines_in_parallel():
+    template = synth_template()
+
+    template.resource_count_is("AWS::Glue::Workflow", 1)
+    template.has_resource_properties("AWS::Glue::Trigger", {
+        "Type": "ON_DEMAND",
+        "WorkflowName": "itada-pipeline-workflow",
+        "Actions": [
+            {"JobName": "itada_work_db_staging"},
+            {"JobName": "itada_dpos_db_staging"}
+        ]
+    })
+    template.has_resource_properties("AWS::Glue::Trigger", {
+        "Type": "CONDITIONAL",
+        "Actions": [{"JobName": "itada_dpos_db_raw"}],
+        "Predicate": {
+            "Conditions": [{
+                "JobName": "itada_dpos_db_staging",
+                "LogicalOperator": "EQUALS",
+                "State": "SUCCEEDED"
+            }],
+            "Logical": "AND"
+        }
+    })
+    # Validated and loaded once both transformation jobs succeeded
+    template.has_resource_properties("AWS::Glue::Trigger", {
+        "Name": "itada-pipeline-workflow-join",
+        "Type": "CONDITIONAL",
+        "Actions": [{"JobName": "itada_pipeline_load"}],
+        "Predicate": {
+            "Conditions": [
+                {"JobName": "itada_work_db_transformation", "LogicalOperator": "EQUALS", "State": "SUCCEEDED"},
+                {"JobName": "itada_dpos_db_transformation", "LogicalOperator": "EQUALS", "State": "SUCCEEDED"}
+            ],
+            "Logical": "AND"
+        }
+    })
+    # One start trigger, three stage transitions per branch and the join
+    assert len(template.find_resources("AWS::Glue::Trigger", {
+        "Properties": {"WorkflowName": "itada-pipeline-workflow"}
+    })) == 8
+
+    # The join job runs the load functions in the state machine's order
+    load_job = next(
+        job["Properties"] for job in template.find_resources("AWS::Glue::Job").values()
+        if job["Properties"]["Name"] == "itada_pipeline_load"
+    )
+    assert load_job["Command"]["Name"] == "pythonshell"
+    aliases = [
+        part["Fn::Select"][1]["Fn::Split"][1]["Ref"]
+        for part in load_job["DefaultArguments"]["--FUNCTION_NAMES"]["Fn::Join"][1] if isinstance(part, dict)
+    ]
+    assert [alias.split("LiveAlias")[0] for alias in aliases] == [
+        "LambdaDevelopPostgresRawDataValidationFunc", "LambdaDevelopRedshiftFunc", "LambdaAuroraSyncFunc"
+    ]
+    # Redshift admits the Glue connection's security group
+    template.has_resource_properties("AWS::EC2::SecurityGroup", {
+        "GroupName": "redshift-cluster-sg",
+        "SecurityGroupIngress": assertions.Match.array_with([assertions.Match.object_like({
+            "FromPort": 5439,
+            "SourceSecurityGroupId": {"Fn::GetAtt": [assertions.Match.string_like_regexp("GlueSg"), "GroupId"]}
+        })])
+    })
+
+
+def test_glue_job_bookmarks():
+    template = synth_template(context={
+        "glue_bookmark_resets": {"itada_work_db_staging": "backfill-1"}
+    })
+
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_work_db_staging",
+        "DefaultArguments": assertions.Match.object_like({
+            "--job-bookmark-option": "job-bookmark-enable",
+            "--BOOKMARK_KEYS": "updated_at",
+            "--BOOKMARK_KEYS_SORT_ORDER": "asc",
+            "--LAST_BUILD_DATE_PATH": "work_db/staging/last_build_date"
+        })
+    })
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_dpos_db_raw",
+        "DefaultArguments": assertions.Match.object_like({
+            "--job-bookmark-option": "job-bookmark-enable"
+        })
+    })
+    template.resource_count_is("Custom::AWS", 1)
+
+
+def test_glue_connections_and_partitioned_jdbc_reads(monkeypatch):
+    monkeypatch.setenv("DEVELOPWORKDB_CONNECTION_URL", "jdbc:postgresql://workdb.internal:5432/work_db")
+    template = synth_template()
+
+    # dpos_db has no connection URL configured here, so only two are created
+    template.resource_count_is("AWS::Glue::Connection", 2)
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_work_db_staging",
+        "Connections": {"Connections": ["develop-workdb-connection"]},
+        "DefaultArguments": assertions.Match.object_like({
+            "--JDBC_FETCH_SIZE": "10000",
+            "--JDBC_TABLE_OPTIONS": json.dumps({"*": {"hashfield": "id", "hashpartitions": "8"}})
+        })
+    })
+    # Credentials come from a pre-created secret, never from the template
+    template.has_resource_properties("AWS::Glue::Connection", {
+        "ConnectionInput": assertions.Match.object_like({
+            "Name": "develop-workdb-connection",
+            "ConnectionProperties": {
+                "JDBC_CONNECTION_URL": "jdbc:postgresql://workdb.internal:5432/work_db",
+                "SECRET_ID": "develop-workdb-connection-credentials"
+            }
+        })
+    })
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_dpos_db_staging",
+        "Connections": assertions.Match.absent()
+    })
+
+
+def test_glue_job_tuning_defaults_and_overrides():
+    template = synth_template(context={
+        "glue_job_tuning": {
+            "itada_upload_csv_to_parquet": {
+                "enable_spark_ui": False,
+                "spark_conf": {"spark.sql.adaptive.enabled": "false"}
+            }
+        }
+    })
+
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_work_db_transformation",
+        "DefaultArguments": assertions.Match.object_like({
+            "--enable-metrics": "true",
+            "--enable-continuous-cloudwatch-log": "true",
+            "--enable-job-insights": "true",
+            "--enable-spark-ui": "true",
+            "--spark-event-logs-path": {
+                "Fn::Join": ["", [
+                    "s3://",
+                    {"Ref": assertions.Match.string_like_regexp("MetadataCenterBucket")},
+                    "/spark-ui-logs/itada_work_db_transformation/"
+                ]]
+            },
+            "--conf": assertions.Match.string_like_regexp("spark.sql.adaptive.enabled=true")
+        })
+    })
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_upload_csv_to_parquet",
+        "DefaultArguments": assertions.Match.object_like({
+            "--enable-spark-ui": assertions.Match.absent(),
+            "--conf": assertions.Match.string_like_regexp("spark.sql.adaptive.enabled=false")
+        })
+    })
+
+
+def test_glue_python_libs_from_versioned_wheelhouse(monkeypatch, tmp_path):
+    for file_name in ("data_lineage.zip", "etl_utils.zip"):
+        (tmp_path / file_name).write_bytes(b"zip")
+    (tmp_path / "wheelhouse").mkdir()
+    (tmp_path / "wheelhouse" / "psycopg2_binary-2.9.9-cp310-cp310-manylinux2014_x86_64.whl").write_bytes(b"whl")
+    monkeypatch.setattr(glue_infrastructure, "PYTHON_LIBS_DIR", str(tmp_path))
+    template = synth_template()
+
+    template.resource_count_is("Custom::CDKBucketDeployment", 1)
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_dpos_db_staging",
+        "DefaultArguments": assertions.Match.object_like({
+            "--extra-py-files": assertions.Match.string_like_regexp(
+                r"^s3://itada-datasource/python-libs/[0-9a-f]+/data_lineage.zip,"
+            ),
+            "--additional-python-modules": assertions.Match.string_like_regexp(
+                r"^s3://itada-datasource/python-libs/[0-9a-f]+/wheelhouse/psycopg2_binary-2.9.9-.*\.whl$"
+            ),
+            "--python-modules-installer-option": "--no-index"
+        })
+    })
+
+
+def test_glue_parquet_compaction_job_and_schedule():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_parquet_compaction",
+        "DefaultArguments": assertions.Match.object_like({
+            "--COMPACTION_PREFIXES": "upload/raw/parquet/",
+            "--TARGET_FILE_SIZE_MB": "256"
+        })
+    })
+    template.has_resource_properties("AWS::Glue::Trigger", {
+        "Name": "itada_parquet_compaction-schedule",
+        "Type": "SCHEDULED",
+        "Schedule": "cron(0 17 ? * SUN *)",
+        "StartOnCreation": True,
+        "Actions": [{"JobName": "itada_parquet_compaction"}],
+        "WorkflowName": assertions.Match.absent()
+    })
+
+
+def test_glue_iceberg_raw_stage():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_work_db_raw",
+        "GlueVersion": "4.0",
+        "DefaultArguments": assertions.Match.object_like({
+            "--datalake-formats": "iceberg",
+            "--ICEBERG_DATABASE": "itada_aws",
+            "--ICEBERG_TABLE_PROPERTIES": assertions.Match.string_like_regexp(
+                '"write.merge.mode": "merge-on-read"'
+            ),
+            "--conf": assertions.Match.string_like_regexp(
+                "spark.sql.catalog.glue_catalog.warehouse=s3://itada-datasource/work_db/raw"
+            )
+        })
+    })
+    # Clean jobs read the raw tables through the same Iceberg catalog
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_dpos_db_clean",
+        "DefaultArguments": assertions.Match.object_like({
+            "--datalake-formats": "iceberg",
+            "--ICEBERG_DATABASE": "itada_aws",
+            "--DATA_CATALOG_PREFIX": "dpos_db_public_",
+            "--conf": assertions.Match.string_like_regexp(
+                "spark.sql.catalog.glue_catalog.warehouse=s3://itada-datasource/dpos_db/raw"
+            )
+        })
+    })
+    template.has_resource_properties("AWS::Glue::Trigger", {
+        "Type": "SCHEDULED",
+        "Actions": [{"JobName": "itada_iceberg_maintenance"}]
+    })
+
+
+def test_glue_transformation_tables_with_partition_projection_and_index(monkeypatch, tmp_path):
+    (tmp_path / "work_db_transformation.json").write_text(json.dumps({"company_id": "string", "amount": "double"}))
+    monkeypatch.setattr(glue_infrastructure, "TABLE_SCHEMAS_DIR", str(tmp_path))
+    template = synth_template()
+
+    # dpos_db_transformation has no schema here, so only work_db_transformation is declared
+    template.resource_count_is("AWS::Glue::Table", 1)
+    template.has_resource_properties("AWS::Glue::Table", {
+        "DatabaseName": "itada_aws",
+        "TableInput": assertions.Match.object_like({
+            "Name": "work_db_transformation",
+            "PartitionKeys": [{"Name": "build_date", "Type": "string"}],
+            "StorageDescriptor": assertions.Match.object_like({
+                "Columns": [{"Name": "company_id", "Type": "string"}, {"Name": "amount", "Type": "double"}]
+            }),
+            "Parameters": assertions.Match.object_like({
+                "projection.enabled": "true",
+                "projection.build_date.type": "date",
+                "projection.build_date.range": "2022-01-01,NOW",
+                "storage.location.template": (
+                    "s3://itada-datasource/work_db/transformation/build_date=${build_date}/"
+                )
+            })
+        })
+    })
+    template.has_resource_properties("Custom::AWS", {
+        "Create": {"Fn::Join": ["", assertions.Match.array_with([
+            assertions.Match.string_like_regexp('"action":"createPartitionIndex"')
+        ])]}
+    })
+    template.resource_count_is("Custom::AWS", 1)
+
+
+def test_glue_iceberg_table_declaration():
+    stack = Itada(core.App(), "itada")
+    glue_construct = next(child for child in stack.node.children if isinstance(child, glue_infrastructure.Glue))
+    table_props = {
+        "name": "work_db_public_company",
+        "format": "iceberg",
+        "location": "s3://itada-datasource/work_db/raw/itada_aws.db/work_db_public_company",
+        "columns": {"id": "bigint", "name": "string"}
+    }
+    glue_construct._create_table(
+        "WorkDbPublicCompanyTable",
+        table_props,
+        catalog_id="123456789012",
+        database=glue_construct.node.find_child("ItadaAwsDatabase")
+    )
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Glue::Table", {
+        "OpenTableFormatInput": {"IcebergInput": {"MetadataOperation": "CREATE", "Version": "2"}},
+        "TableInput": assertions.Match.object_like({
+            "Name": "work_db_public_company",
+            "Parameters": assertions.Match.object_like({"write.delete.mode": "merge-on-read"}),
+            "StorageDescriptor": {
+                "Columns": [{"Name": "id", "Type": "bigint"}, {"Name": "name", "Type": "string"}],
+                "Location": "s3://itada-datasource/work_db/raw/itada_aws.db/work_db_public_company"
+            }
+        })
+    })
+
+    with pytest.raises(ValueError, match="cannot declare Hive partitions"):
+        glue_construct._create_table(
+            "InvalidIcebergTable",
+            {**table_props, "partition_keys": {"build_date": "string"}},
+            catalog_id="123456789012",
+            database=glue_construct.node.find_child("ItadaAwsDatabase")
+        )
+
+
+def test_lambda_memory_architecture_and_power_tuning():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "develop-postgres-raw-data-validation",
+        "MemorySize": 1024,
+        "Architectures": ["x86_64"]
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "resource-cleanup",
+        "MemorySize": 128,
+        "Architectures": ["arm64"]
+    })
+    template.has_resource_properties("AWS::Serverless::Application", {
+        "Location": assertions.Match.object_like({
+            "ApplicationId": assertions.Match.string_like_regexp("aws-lambda-power-tuning")
+        }),
+        "Parameters": assertions.Match.object_like({
+            "PowerValues": "128,256,512,1024,1536,2048,3008"
+        })
+    })
+
+
+def test_lambda_power_tuning_can_be_disabled():
+    template = synth_template(context={"lambda_power_tuning": False})
+
+    template.resource_count_is("AWS::Serverless::Application", 0)
+
+
+def test_lambda_shared_layers(built_lambda_layers):
+    template = synth_template(context={"lambda_instrumentation": "false"})
+
+    template.resource_count_is("AWS::Lambda::LayerVersion", 2)
+    template.has_resource_properties("AWS::Lambda::LayerVersion", {
+        "LayerName": "itada-db-drivers",
+        "CompatibleRuntimes": ["python3.12"]
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "query-data-lineage",
+        "Layers": assertions.Match.array_with([{"Ref": assertions.Match.string_like_regexp("DbDriversLayer")}])
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "resource-cleanup",
+        "Layers": assertions.Match.absent()
+    })
+
+    # A rebuild with different contents publishes a new layer version
+    layer_key = template.find_resources("AWS::Lambda::LayerVersion", {
+        "Properties": {"LayerName": "itada-db-drivers"}
+    }).popitem()[1]["Properties"]["Content"]["S3Key"]
+    (built_lambda_layers / "db_drivers" / "python" / "psycopg2" / "_psycopg.so").write_bytes(b"aarch64")
+    template = synth_template(context={"lambda_instrumentation": "false"})
+    template.has_resource_properties("AWS::Lambda::LayerVersion", {
+        "LayerName": "itada-db-drivers",
+        "Content": assertions.Match.object_like({"S3Key": assertions.Match.not_(layer_key)})
+    })
+
+
+def test_lambda_unbuilt_layer_fails_synth(built_lambda_layers):
+    (built_lambda_layers / "itada_utils" / "python" / "data_lineage" / "__init__.py").unlink()
+    (built_lambda_layers / "itada_utils" / "python" / "data_lineage").rmdir()
+    (built_lambda_layers / "itada_utils" / "python").rmdir()
+
+    with pytest.raises(Exception, match="Lambda layer itada-utils is not built"):
+        synth_template()
+
+
+def test_lambda_provisioned_concurrency_alias():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "query-data-lineage",
+        "ReservedConcurrentExecutions": 20
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "develop-postgres-raw-data-validation",
+        "ReservedConcurrentExecutions": 2
+    })
+    template.has_resource_properties("AWS::Lambda::Alias", {
+        "Name": "live",
+        "FunctionName": {"Ref": assertions.Match.string_like_regexp("QueryDataLineageFunc")},
+        "ProvisionedConcurrencyConfig": {"ProvisionedConcurrentExecutions": 1}
+    })
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalableTarget", {
+        "MinCapacity": 1,
+        "MaxCapacity": 5,
+        "ScalableDimension": "lambda:function:ProvisionedConcurrency",
+        "ScheduledActions": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "Schedule": "cron(0 22 ? * SUN-THU *)",
+                "ScalableTargetAction": {"MinCapacity": 2}
+            })
+        ])
+    })
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalingPolicy", {
+        "TargetTrackingScalingPolicyConfiguration": assertions.Match.object_like({
+            "TargetValue": 0.7
+        })
+    })
+    # The SNS subscription has to invoke the alias to use the warm environments
+    template.has_resource_properties("AWS::Lambda::Permission", {
+        "FunctionName": {"Ref": assertions.Match.string_like_regexp("QueryDataLineageFuncLiveAlias")},
+        "Principal": "sns.amazonaws.com",
+        "SourceAccount": {"Ref": "AWS::AccountId"}
+    })
+
+
+# Oldest Node.js runtime Lambda still accepts for new deployments
+MINIMUM_NODEJS_VERSION = 20
+
+
+def test_lambda_runtimes_meet_minimum_version(monkeypatch, tmp_path):
+    # Python libs and bookmark resets add the BucketDeployment and
+    # AwsCustomResource singleton handlers of aws-cdk-lib
+    for file_name in ("data_lineage.zip", "etl_utils.zip"):
+        (tmp_path / file_name).write_bytes(b"zip")
+    (tmp_path / "wheelhouse").mkdir()
+    (tmp_path / "wheelhouse" / "psycopg2_binary-2.9.9-cp310-cp310-manylinux2014_x86_64.whl").write_bytes(b"whl")
+    monkeypatch.setattr(glue_infrastructure, "PYTHON_LIBS_DIR", str(tmp_path))
+    template = synth_template(context={
+        "glue_bookmark_resets": {"itada_work_db_staging": "backfill-1"}
+    })
+
+    template.resource_count_is("Custom::CDKBucketDeployment", 1)
+    assert template.find_resources("Custom::AWS")
+    # Every function, including the handlers aws-cdk-lib adds to the stack
+    functions = template.find_resources("AWS::Lambda::Function")
+    runtimes = {function["Properties"]["Runtime"] for function in functions.values()}
+    assert any(runtime.startswith("nodejs") for runtime in runtimes), runtimes
+    for logical_id, function in functions.items():
+        runtime = function["Properties"]["Runtime"]
+        # Custom resource providers of aws-cdk-lib run on Node.js
+        if runtime.startswith("nodejs"):
+            assert int(runtime[len("nodejs"):].split(".")[0]) >= MINIMUM_NODEJS_VERSION, (logical_id, runtime)
+            continue
+        assert runtime.startswith("python"), logical_id
+        version = tuple(int(part) for part in runtime[len("python"):].split("."))
+        assert version >= lambda_infrastructure.MINIMUM_PYTHON_VERSION, (logical_id, runtime)
+
+
+def test_lambda_snap_start_on_live_alias():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "aurora-sync",
+        "SnapStart": {"ApplyOn": "PublishedVersions"}
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "query-data-lineage",
+        "SnapStart": assertions.Match.absent()
+    })
+    # aurora-sync, develop-postgres-raw-data-validation, develop-redshift and query-data-lineage
+    template.resource_count_is("AWS::Lambda::Alias", 4)
+
+
+def test_aurora_connections_from_lambdas():
+    template = synth_template()
+
+    # Still the Serverless v1 cluster, RDS Proxy cannot target it
+    template.has_resource_properties("AWS::RDS::DBCluster", {
+        "DBClusterIdentifier": "itada-aurora-cluster",
+        "EngineMode": "serverless",
+        "EnableHttpEndpoint": True
+    })
+    template.resource_count_is("AWS::RDS::DBProxy", 0)
+    template.has_resource_properties("AWS::EC2::SecurityGroup", {
+        "GroupName": "aurora-cluster-sg",
+        "SecurityGroupIngress": assertions.Match.array_with([assertions.Match.object_like({
+            "FromPort": 5432,
+            "SourceSecurityGroupId": {"Fn::GetAtt": [assertions.Match.string_like_regexp("ItadaVpc"), "DefaultSecurityGroup"]}
+        })])
+    })
+    # The handlers connect with psycopg2 from the itada-db-drivers layer
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "aurora-sync",
+        "Environment": {
+            "Variables": assertions.Match.object_like({
+                "AURORA_CLUSTER_ARN": assertions.Match.absent(),
+                "AURORA_SECRET_ARN": assertions.Match.any_value()
+            })
+        }
+    })
+    template.has_resource_properties("AWS::SecretsManager::Secret", {
+        "Name": "itada-aurora-cluster-credentials"
+    })
+
+
+def test_csv_upload_batched_sqs_ingestion():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::SQS::Queue", {
+        "QueueName": "csv-upload-queue",
+        "VisibilityTimeout": 420,
+        "RedrivePolicy": {
+            "deadLetterTargetArn": {"Fn::GetAtt": [assertions.Match.string_like_regexp("CsvUploadQueueDlq"), "Arn"]},
+            "maxReceiveCount": 3
+        }
+    })
+    template.has_resource_properties("Custom::S3BucketNotifications", {
+        "BucketName": "itada-datasource",
+        "NotificationConfiguration": {
+            "QueueConfigurations": [assertions.Match.object_like({
+                "Events": ["s3:ObjectCreated:*"],
+                "Filter": {"Key": {"FilterRules": [
+                    {"Name": "suffix", "Value": ".csv"},
+                    {"Name": "prefix", "Value": "upload/raw/csv/"}
+                ]}}
+            })]
+        }
+    })
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "FunctionName": {"Ref": assertions.Match.string_like_regexp("TriggerCsvUploadSfLambdaFunc")},
+        "BatchSize": 100,
+        "MaximumBatchingWindowInSeconds": 30,
+        "FunctionResponseTypes": ["ReportBatchItemFailures"]
+    })
+
+
+def test_vpc_endpoints_bypass_nat():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::EC2::VPCEndpoint", {
+        "ServiceName": {"Fn::Join": ["", ["com.amazonaws.", {"Ref": "AWS::Region"}, ".s3"]]},
+        "VpcEndpointType": "Gateway"
+    })
+    template.has_resource_properties("AWS::EC2::VPCEndpoint", {
+        "ServiceName": {"Fn::Join": ["", ["com.amazonaws.", {"Ref": "AWS::Region"}, ".redshift-data"]]},
+        "VpcEndpointType": "Interface",
+        "PrivateDnsEnabled": True
+    })
+    # Private DNS resolves the services to the endpoints for every security group in the VPC
+    template.has_resource_properties("AWS::EC2::SecurityGroup", {
+        "GroupName": "vpc-endpoint-sg",
+        "SecurityGroupIngress": [{
+            "CidrIp": {"Fn::GetAtt": [assertions.Match.string_like_regexp("ItadaVpc"), "CidrBlock"]},
+            "Description": assertions.Match.any_value(),
+            "FromPort": 443,
+            "IpProtocol": "tcp",
+            "ToPort": 443
+        }]
+    })
+    # s3 + glue, secretsmanager, states, sts, logs, redshift-data
+    template.resource_count_is("AWS::EC2::VPCEndpoint", 7)
+
+    template = synth_template(context={"vpc_interface_endpoints": '{"RedshiftData": false}'})
+    template.resource_count_is("AWS::EC2::VPCEndpoint", 6)
+
+
+def test_lambda_instrumentation():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "query-data-lineage",
+        "TracingConfig": {"Mode": "Active"},
+        "Environment": {"Variables": assertions.Match.object_like({
+            "POWERTOOLS_SERVICE_NAME": "query-data-lineage",
+            "POWERTOOLS_METRICS_NAMESPACE": "Itada",
+            "POWERTOOLS_LOG_LEVEL": "WARNING"
+        })}
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "trigger-csv-upload-sf",
+        "Layers": [{"Fn::Join": ["", assertions.Match.array_with([
+            assertions.Match.string_like_regexp("AWSLambdaPowertoolsPythonV3-python312-arm64:")
+        ])]}],
+        "Environment": {"Variables": assertions.Match.object_like({"POWERTOOLS_LOG_LEVEL": "INFO"})}
+    })
+
+    template = synth_template(context={"lambda_instrumentation": "false"})
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "trigger-csv-upload-sf",
+        "TracingConfig": assertions.Match.absent(),
+        "Layers": assertions.Match.absent()
+    })
+
+
+def test_lambda_secrets_extension():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "develop-redshift",
+        "Layers": assertions.Match.array_with([{"Fn::Join": ["", assertions.Match.array_with([
+            {"Fn::FindInMap": [assertions.Match.string_like_regexp("SecretsExtensionAccounts"), {"Ref": "AWS::Region"}, "account"]},
+            assertions.Match.string_like_regexp("AWS-Parameters-and-Secrets-Lambda-Extension:11")
+        ])]}]),
+        "Environment": {"Variables": assertions.Match.object_like({
+            "REDSHIFT_SECRET_ARN": {"Ref": assertions.Match.string_like_regexp("RedshiftClusterSecret")},
+            "PARAMETERS_SECRETS_EXTENSION_CACHE_ENABLED": "true",
+            "SECRETS_MANAGER_TTL": "900"
+        })}
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "aurora-sync",
+        "Environment": {"Variables": assertions.Match.object_like({"SECRETS_MANAGER_TTL": "300"})}
+    })
+
+    # The Redshift master password is generated, and the Glue connection reads it from the secret
+    template.has_resource_properties("AWS::SecretsManager::Secret", {
+        "Name": "itada-redshift-cluster-credentials",
+        "GenerateSecretString": assertions.Match.object_like({"GenerateStringKey": "password"})
+    })
+    template.has_resource_properties("AWS::Redshift::Cluster", {
+        "ClusterIdentifier": "itada-redshift-cluster",
+        "MasterUsername": "awsuser"
+    })
+    template.has_resource_properties("AWS::Glue::Connection", {
+        "ConnectionInput": assertions.Match.object_like({
+            "Name": "develop-redshift-connection",
+            "ConnectionProperties": assertions.Match.object_like({
+                "SECRET_ID": assertions.Match.any_value()
+            })
+        })
+    })
+
+
+def test_lambda_async_invocation_config():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::Lambda::EventInvokeConfig", {
+        "FunctionName": {"Ref": assertions.Match.string_like_regexp("ResourceCleanupFunc")},
+        "Qualifier": "$LATEST",
+        "MaximumEventAgeInSeconds": 60,
+        "MaximumRetryAttempts": 0,
+        "DestinationConfig": {
+            "OnFailure": {"Destination": {"Fn::GetAtt": [assertions.Match.string_like_regexp("LambdaAsyncFailureQueue"), "Arn"]}}
+        }
+    })
+    template.has_resource_properties("AWS::Lambda::EventInvokeConfig", {
+        "FunctionName": {"Ref": assertions.Match.string_like_regexp("ReloadAppBackendDataFunc")},
+        "MaximumRetryAttempts": 1,
+        "DestinationConfig": {
+            "OnSuccess": {"Destination": assertions.Match.any_value()},
+            "OnFailure": assertions.Match.any_value()
+        }
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "resource-cleanup",
+        "ReservedConcurrentExecutions": 5
+    })
+
+
+def test_itada_pipeline_definition_from_s3_by_default():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::StepFunctions::StateMachine", {
+        "StateMachineName": "develop-Itada-state-machine",
+        "DefinitionS3Location": {
+            "Bucket": "itada-cdk-scripts",
+            "Key": "step_funcs/develop-Itada-state-machine.json"
+        },
+        "DefinitionString": assertions.Match.absent()
+    })
+
+
+def test_itada_pipeline_runs_sources_in_parallel():
+    template = synth_template(context={"itada_pipeline_from_code": "true"})
+    definition = state_machine_definition(template, "develop-Itada-state-machine")
+    states = definition["States"]
+
+    assert definition["StartAt"] == "TransformSources"
+    assert states["TransformSources"]["Type"] == "Parallel"
+    branches = states["TransformSources"]["Branches"]
+    assert len(branches) == 2
+
+    for branch, source in zip(branches, ["work_db", "dpos_db"]):
+        job_names = [state["Parameters"]["JobName"] for state in branch["States"].values()]
+        assert job_names == [f"itada_{source}_{stage}" for stage in ["staging", "raw", "clean", "transformation"]]
+        for state in branch["States"].values():
+            assert state["Resource"].endswith(":states:::glue:startJobRun.sync")
+            assert state["Retry"][0]["BackoffRate"] == 2
+
+    assert states["TransformSources"]["Next"] == "DevelopPostgresRawDataValidationTask"
+    assert states["DevelopPostgresRawDataValidationTask"]["Next"] == "DevelopRedshiftTask"
+    load_redshift = states["DevelopRedshiftTask"]
+    assert load_redshift["Type"] == "Task"
+    assert load_redshift["Retry"][0]["ErrorEquals"][0] == "Lambda.ServiceException"
+    assert states[load_redshift["Next"]]["End"] is True
+
+
+def test_state_machine_types():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::StepFunctions::StateMachine", {
+        "StateMachineName": "csv-upload-express-state-machine",
+        "StateMachineType": "EXPRESS",
+        "LoggingConfiguration": assertions.Match.object_like({"Level": "ERROR", "IncludeExecutionData": False}),
+        "TracingConfiguration": {"Enabled": True}
+    })
+    template.has_resource_properties("AWS::StepFunctions::StateMachine", {
+        "StateMachineName": "develop-Itada-state-machine",
+        "StateMachineType": "STANDARD",
+        "LoggingConfiguration": assertions.Match.object_like({"Level": "ALL", "IncludeExecutionData": True})
+    })
+    template.has_resource_properties("AWS::Logs::LogGroup", {
+        "LogGroupName": "/aws/vendedlogs/states/csv-upload-express-state-machine-Logs",
+        "RetentionInDays": 3
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "trigger-csv-upload-sf",
+        "Environment": {"Variables": assertions.Match.object_like({
+            "STATE_MACHINE_ARN": {"Fn::GetAtt": [assertions.Match.string_like_regexp("CsvUploadStateMachine"), "Arn"]},
+            "STATE_MACHINE_EXECUTION": "sync"
+        })}
+    })
+
+
+def test_express_graph_limits():
+    check_graph = stepfunctions_infrastructure._check_graph
+    glue_task = {"Type": "Task", "Resource": "arn:aws:states:::glue:startJobRun.sync", "End": True}
+    lambda_task = {"Type": "Task", "Resource": "arn:aws:lambda:eu-west-1:123456789012:function:f", "End": True}
+
+    check_graph("sm", {"StartAt": "Job", "States": {"Job": glue_task}}, express=False)
+    check_graph("sm", {"StartAt": "Invoke", "States": {"Invoke": lambda_task}}, express=True)
+    with pytest.raises(ValueError, match="request-response"):
+        check_graph("sm", {"StartAt": "Job", "States": {"Job": glue_task}}, express=True)
+    with pytest.raises(ValueError, match="at most 300s"):
+        check_graph("sm", {"StartAt": "Invoke", "TimeoutSeconds": 900, "States": {"Invoke": lambda_task}}, express=True)
+
+    # Distributed Map child workflows running as EXPRESS inside a STANDARD parent
+    distributed_map = {
+        "Type": "Map",
+        "ItemProcessor": {
+            "ProcessorConfig": {"Mode": "DISTRIBUTED", "ExecutionType": "EXPRESS"},
+            "StartAt": "Job",
+            "States": {"Job": glue_task}
+        },
+        "End": True
+    }
+    with pytest.raises(ValueError, match="request-response"):
+        check_graph("sm", {"StartAt": "Map", "States": {"Map": distributed_map}}, express=False)
+
+
+def test_csv_bulk_upload_distributed_map():
+    definition = state_machine_definition(synth_template(), "csv-bulk-upload-state-machine")
+    states = definition["States"]
+
+    distributed_map = states[definition["StartAt"]]
+    assert distributed_map["Type"] == "Map"
+    assert distributed_map["ItemReader"]["Resource"] == "arn:aws:states:::s3:listObjectsV2"
+    assert distributed_map["ItemReader"]["Parameters"] == {"Bucket": "itada-datasource", "Prefix": "upload/bulk/csv/"}
+    assert distributed_map["ResultWriter"]["Parameters"]["Bucket"] == "itada-datasource"
+    assert distributed_map["ItemProcessor"]["ProcessorConfig"] == {"Mode": "DISTRIBUTED", "ExecutionType": "EXPRESS"}
+    assert distributed_map["ItemBatcher"]["MaxItemsPerBatch"] == 100
+    assert distributed_map["MaxConcurrency"] == 50
+    assert distributed_map["ToleratedFailurePercentage"] == 5
+
+    # Child workflows move each listed file under the run's staging prefix
+    stage_files = distributed_map["ItemProcessor"]["States"]["StageCsvFiles"]
+    file_states = stage_files["ItemProcessor"]["States"]
+    assert [state["Resource"].rsplit(":", 2)[-2:] for state in file_states.values()] == [
+        ["s3", "copyObject"], ["s3", "deleteObject"]
+    ]
+    stage_file = file_states["StageCsvFile"]
+    assert stage_file["QueryLanguage"] == "JSONata"
+    # Keys with spaces or '+' only copy with a URL-encoded CopySource
+    assert stage_file["Arguments"]["CopySource"] == (
+        "{% 'itada-datasource/' & $join($map($split($states.input.key, '/'), $encodeUrlComponent), '/') %}"
+    )
+    assert stage_file["Arguments"]["Key"] == "{% 'upload/staged/' & $states.input.run_id & '/' & $states.input.key %}"
+    assert stage_file["Output"] == "{% $states.input %}"
+
+    # One job run for the whole staged set, after every child workflow finished
+    convert = states[distributed_map["Next"]]
+    assert convert["Parameters"]["JobName"] == "itada_upload_csv_to_parquet"
+    assert convert["Parameters"]["Arguments"] == {
+        "--CSV_PATH.$": "States.Format('upload/staged/{}/upload/bulk/csv/', $$.Execution.Name)"
+    }
+    assert convert["End"] is True
+
+
+def test_state_machine_logging_per_environment():
+    template = synth_template()
+
+    template.has_resource_properties("AWS::StepFunctions::StateMachine", {
+        "StateMachineName": "develop-Itada-state-machine",
+        "LoggingConfiguration": assertions.Match.object_like({"Level": "ALL", "IncludeExecutionData": True}),
+        "TracingConfiguration": {"Enabled": False}
+    })
+    template.has_resource_properties("AWS::StepFunctions::StateMachine", {
+        "StateMachineName": "csv-bulk-upload-state-machine",
+        "LoggingConfiguration": assertions.Match.object_like({"Level": "ERROR", "IncludeExecutionData": False})
+    })
+
+    template = synth_template(context={"environment": "prod"})
+    template.has_resource_properties("AWS::StepFunctions::StateMachine", {
+        "StateMachineName": "develop-Itada-state-machine",
+        "LoggingConfiguration": assertions.Match.object_like({"Level": "ERROR", "IncludeExecutionData": False}),
+        "TracingConfiguration": {"Enabled": True}
+    })
+    template.has_resource_properties("AWS::Logs::LogGroup", {
+        "LogGroupName": "/aws/vendedlogs/states/develop-Itada-state-machine-Logs",
+        "RetentionInDays": 30
+    })
+
+    # Traced state machines send their segments as StepFunctionRole
+    template.has_resource_properties("AWS::IAM::Policy", {
+        "PolicyName": "StepFunctionXray",
+        "PolicyDocument": {"Statement": [assertions.Match.object_like({
+            "Action": [
+                "xray:PutTraceSegments",
+                "xray:PutTelemetryRecords",
+                "xray:GetSamplingRules",
+                "xray:GetSamplingTargets"
+            ],
+            "Effect": "Allow",
+            "Resource": "*"
+        })]},
+        "Roles": [{"Ref": assertions.Match.string_like_regexp("StepFunctionRole")}]
+    })
+
+    with pytest.raises(Exception, match="Unknown environment"):
+        synth_template(context={"environment": "staging"})
+
+
+def test_glue_backfill_with_bounded_parallel_runs():
+    template = synth_template()
+
+    # One run at a time until the transformation scripts read --BUILD_DATE
+    template.has_resource_properties("AWS::Glue::Job", {
+        "Name": "itada_work_db_transformation",
+        "ExecutionProperty": {"MaxConcurrentRuns": 1}
+    })
+
+    definition = state_machine_definition(template, "itada-backfill-state-machine")
+    backfill = definition["States"][definition["StartAt"]]
+    assert backfill["Type"] == "Parallel"
+    for branch in backfill["Branches"]:
+        runs = branch["States"][branch["StartAt"]]
+        assert runs["Type"] == "Map"
+        assert runs["ItemsPath"] == "$.build_dates"
+        # The job's max_concurrent_runs
+        assert runs["MaxConcurrency"] == 1
+        run = runs["ItemProcessor"]["States"][runs["ItemProcessor"]["StartAt"]]
+        assert run["Resource"].endswith(":states:::glue:startJobRun.sync")
+        assert run["Parameters"]["Arguments"] == {"--BUILD_DATE.$": "$.item"}
+        assert "Glue.ConcurrentRunsExceededException" in run["Retry"][0]["ErrorEquals"]
+